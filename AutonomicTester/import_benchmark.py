@@ -0,0 +1,82 @@
+"""
+This file benchmarks the startup time of the Autonomic Tester CLI to guard against slow imports.
+
+Run from the repository root: python AutonomicTester/import_benchmark.py [--runs 5] [--max-seconds 1.0]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+SUBCOMMANDS = ["", "generate", "finetune", "prompt", "ragquery", "summarize"]
+# Heavy dependencies that must only be imported by the handler of a subcommand
+HEAVY_MODULES = [
+    "transformers",
+    "llama_index",
+    "ollama",
+    "openai",
+    "tiktoken",
+    "matplotlib",
+    "pandas",
+    "huggingface_hub",
+]
+
+
+def measure_startup(subcommand: str, runs: int) -> float:
+    """
+    Returns the median wall time in seconds of printing the help message of a subcommand.
+    """
+    command = [sys.executable, MAIN_PATH] + subcommand.split() + ["--help"]
+    durations = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run(command, check=True, capture_output=True)
+        durations.append(time.perf_counter() - start_time)
+    return statistics.median(durations)
+
+
+def find_heavy_imports(subcommand: str) -> list:
+    """
+    Returns heavy modules imported when printing the help message of a subcommand.
+    """
+    command = [sys.executable, "-X", "importtime", MAIN_PATH] + subcommand.split() + ["--help"]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    imported_modules = set()
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if line.startswith("import time:") and "|" in line:
+            imported_modules.add(line.split("|")[-1].strip().split(".")[0])
+    return [module for module in HEAVY_MODULES if module in imported_modules]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of the CLI.")
+    parser.add_argument("--runs", type=int, default=5, help="number of runs per subcommand")
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help="fail if the median startup time of any subcommand exceeds this limit",
+    )
+    args = parser.parse_args()
+
+    is_regressed = False
+    for subcommand in SUBCOMMANDS:
+        duration = measure_startup(subcommand, args.runs)
+        heavy_imports = find_heavy_imports(subcommand)
+        print(
+            f"main.py {subcommand} --help: {duration:.3f}s, heavy imports: {', '.join(heavy_imports) or 'none'}"
+        )
+        if heavy_imports or (args.max_seconds is not None and duration > args.max_seconds):
+            is_regressed = True
+    if is_regressed:
+        print("Startup regression: heavy dependencies must be imported lazily by subcommand handlers")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,12 @@ BUGS_PATH = os.path.join("Defect4AutonomicTesting", "bugs")
 EXPERIMENT_RESULTS_PATH = os.path.join("AutonomicTester", "experiment_results")
 PROMPT_TEMPLATE_PATH = "AutonomicTester/src/prompt/template"
 CONFIG_PATH = os.path.join("AutonomicTester", "config.json")
+LLM_CACHE_PATH = os.path.join("AutonomicTester", "llm_cache.sqlite")
+RAG_INDEX_CACHE_PATH = os.path.join("AutonomicTester", "rag_index_cache")
 DEFACTS4J_PATH = "Defects4jDataset"
 DEFACTS4J_PROMPT_PATH = os.path.join(DEFACTS4J_PATH, "prompts")
 FEW_SHOTS_PATH = "AutonomicTester/src/prompt/fewshots"
 PROMPT_DATASET_PATH = "PromptDataset"
+TOKEN_INDEX_PATH = "token_index.sqlite"  # token counts of prompts beside PromptDataset
+PROMPT_CATALOG_PATH = os.path.join(PROMPT_DATASET_PATH, "catalog.sqlite")
 FINE_TUNE_LLM_VALIDATION_PATH = os.path.join("FineTuneDataset", "validation_paths_v4_q3diff5p.json")
@@ -7,6 +7,33 @@ from src.llm.llm_kind import LLMKind
 from src.prompt.prompt_kind import PromptKind
 from src import EXPERIMENT_RESULTS_PATH
 
+
+def positive_int(value):
+    """
+    Parses a positive integer argument, e.g., a number of workers.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not an integer")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def non_negative_int(value):
+    """
+    Parses a non-negative integer argument, e.g., a number of optional workers.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not an integer")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"{value} is not a non-negative integer")
+    return number
+
+
 # Shared parser varilables
 logging_parser = argparse.ArgumentParser(add_help=False)
 logging_parser.add_argument(
@@ -52,6 +79,19 @@ query_parser.add_argument(
     help="the selection of queries"
 )
 
+cache_parser = argparse.ArgumentParser(add_help=False)
+cache_parser.add_argument(
+    "--cache",
+    choices=["on", "off"],
+    default="off",
+    help=f"enable or disable the on-disk cache of LLM responses shared across experiments",
+)
+cache_parser.add_argument(
+    "--cache-size",
+    default=1024,
+    help=f"maximum size in MB of cached LLM responses, evicting the least recently used responses beyond it",
+)
+
 main_args_parser = argparse.ArgumentParser(
     prog="Autonomic Tester",
     description="This program generates prompting texts from extracted testing components, prompts Large Language Models (LLMs) with predefined questions, and summarize answers from LLMs.",
@@ -64,6 +104,17 @@ parser_generate = subparsers.add_parser(
     parents=[version_parser, project_parser, query_parser, logging_parser],
     help="generate prompting texts from extracted testing components and save to the prompts folder",
 )
+parser_generate.add_argument(
+    "-w",
+    "--workers",
+    default=None,
+    help=f"number of processes generating prompts of bugs in parallel, default using all CPUs",
+)
+parser_generate.add_argument(
+    "--incremental",
+    action="store_true",
+    help=f"regenerate only prompts whose components or template changed since the last generation",
+)
 parser_generate.set_defaults(func=generate_prompts)
 
 # Functionality for fine-tuning
@@ -76,7 +127,7 @@ parser_finetune = subparsers.add_parser(
 parser_finetune.add_argument(
     "--create-dataset",
     action="store_true",
-    help=f"create a JSON fine-tuning dataset using 10% from both Defects4J and Defects4AT",
+    help=f"create a JSON fine-tuning dataset using 10%% from both Defects4J and Defects4AT",
 )
 parser_finetune.add_argument(
     "--submit-job",
@@ -100,7 +151,7 @@ parser_finetune.set_defaults(func=fine_tune)
 # Functionality for prompting LLMs
 parser_prompt = subparsers.add_parser(
     "prompt",
-    parents=[version_parser, dataset_parser, project_parser, query_parser, logging_parser],
+    parents=[version_parser, dataset_parser, project_parser, query_parser, cache_parser, logging_parser],
     help="prompt LLMs with predefined questions",
 )
 parser_prompt.add_argument(
@@ -151,12 +202,35 @@ parser_prompt.add_argument(
     default="off",
     help=f"enable or disable test case generation",
 )
+parser_prompt.add_argument(
+    "-w",
+    "--workers",
+    type=positive_int,
+    default=1,
+    help=f"number of prompts sent to the LLM concurrently, default sending one prompt at a time",
+)
+parser_prompt.add_argument(
+    "--validation-workers",
+    type=non_negative_int,
+    default=0,
+    help=f"number of generated test cases compiled and executed with Defects4J concurrently in a separate pool from LLM requests, default validating within each prompting worker",
+)
+parser_prompt.add_argument(
+    "--rescan-prompts",
+    action="store_true",
+    help=f"scan the prompts folder again before selecting prompts, needed after prompts were added, removed or edited without the generate subcommand (e.g., extracted from an archive)",
+)
+parser_prompt.add_argument(
+    "--resume",
+    help=f"a path to the experiment folder of an interrupted run to resume, skipping prompts that are already completed",
+    default=None,
+)
 parser_prompt.set_defaults(func=prompt_llm)
 
 # Functionality for querying LLMs with RAG
 parser_rag_query = subparsers.add_parser(
     "ragquery",
-    parents=[version_parser, dataset_parser, project_parser, query_parser, logging_parser],
+    parents=[version_parser, dataset_parser, project_parser, query_parser, cache_parser, logging_parser],
     help="query LLMs with RAG",
 )
 parser_rag_query.add_argument(
@@ -180,12 +254,31 @@ parser_rag_query.add_argument(
     help="an index format for RAG.",
     required=True,
 )
+parser_rag_query.add_argument(
+    "--index-cache",
+    choices=["on", "off"],
+    default="off",
+    help=f"enable or disable reusing vector indexes persisted on disk while the indexed .java files are unchanged",
+)
 parser_rag_query.add_argument(
     "-t",
     "--temperature",
     help=f"a float number that influences the LLM's output (higher is more creative, lower is more coherent)",
     default=0.75,
 )
+parser_rag_query.add_argument(
+    "-w",
+    "--workers",
+    type=positive_int,
+    default=1,
+    help=f"number of bugs processed and queries sent to the LLM concurrently, default sending one query at a time",
+)
+parser_rag_query.add_argument(
+    "--shared-retrieval",
+    choices=["on", "off"],
+    default="off",
+    help=f"enable or disable retrieving context once per scenario from its monitored scenario, test suite, class and method shared by all questions, instead of once per question",
+)
 parser_rag_query.set_defaults(func=query_llm_with_rag)
 
 # Functionality for summarizing answers from LLMs
@@ -197,7 +290,7 @@ parser_summarize = subparsers.add_parser(
 parser_summarize.add_argument(
     "-e",
     "--experiment",
-    help=f"a target experiment folder in AutonomicTester/experiment_results/ to summarize results",
+    help=f"a target experiment folder in AutonomicTester/experiment_results/ to summarize results, default summarizing all experiments in the path",
     default="",
 )
 parser_summarize.add_argument(
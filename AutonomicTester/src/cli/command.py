@@ -1,41 +1,22 @@
-import json
-import os
-import re
-import time
-import ollama
-import tiktoken
-import subprocess
-from pathlib import Path
-import shutil
-import huggingface_hub
-import pandas as pd
-from transformers import AutoTokenizer
-from src.rag.rag_query_handler import RagQueryHandler
-from src.cli.prompt_llm_handler import PromptLlmHandler
-from src import PROMPT_DATASET_PATH, PROMPT_TEMPLATE_PATH
-from src.prompt.dataset import create_fine_tuning_dataset
-from src.prompt.fewshots import generate_few_shots_msg
-from src.stats.stats import (
-    analyze_answers_from_summary,
-    analyze_answers_from_summary_in_binary_classification,
-    summarize_prompt_statistics_for_defects4j,
-)
-from src.llm.chatgpt.chatgpt_api import check_job_status, fine_tune_gpt, prompt_gpt
-from src.output.output import (
-    create_experiment_folder,
-    extract_and_save_results,
-    summarize_results,
-    write_arguments,
-)
-from src.prompt.prompt import PromptBuilder
+"""
+Handlers of the subcommands.
+
+Each handler imports its dependencies when it runs, so a subcommand only loads the
+heavy libraries it uses (e.g., transformers, llama_index or matplotlib).
+"""
 
 
 def generate_prompts(args):
     """
     Generates prompts in TXT format with the specified components.
     """
+    from src.prompt.prompt import PromptBuilder
+
     args.queries.sort(key=lambda x: int(x[1:]))
-    pb = PromptBuilder(int(args.version), args.queries)
+    num_workers = int(args.workers) if args.workers is not None else None
+    pb = PromptBuilder(
+        int(args.version), args.queries, num_workers, args.incremental
+    )
     pb.generate_prompts_for_defects4at()
     pb.generate_prompts_for_defects4j()
 
@@ -44,6 +25,9 @@ def fine_tune(args):
     """
     Fine-tunes a specified LLM with the curated datatset.
     """
+    from src.llm.chatgpt.chatgpt_api import check_job_status, fine_tune_gpt
+    from src.prompt.dataset import create_fine_tuning_dataset
+
     if args.create_dataset:
         create_fine_tuning_dataset(args.version, args.projects, args.source_datasets)
     if args.submit_job:
@@ -56,6 +40,8 @@ def prompt_llm(args):
     """
     Prompts an LLM with the generated prompting texts.
     """
+    from src.cli.prompt_llm_handler import PromptLlmHandler
+
     prompt_llm_handler = PromptLlmHandler(args)
     prompt_llm_handler.start_prompting()
 
@@ -64,12 +50,17 @@ def query_llm_with_rag(args):
     """
     Queries an LLM with RAG.
     """
+    from src.rag.rag_query_handler import RagQueryHandler
+
     rag_query_handler = RagQueryHandler(args)
     rag_query_handler.analyze_test_suites()
     rag_query_handler.run_experiments()
 
 
 def summarize_answers(args):
+    from src.output.output import summarize_results
+    from src.stats.stats import analyze_answers_from_summary, summarize_all_experiments
+
     version = args.version
     queries = args.queries
     path = args.path
@@ -79,16 +70,10 @@ def summarize_answers(args):
     # suffixes = ["buggy", "fixed", "similar", "all"]
     # pattern = re.compile(r"^\d{8}_\d{6}_.*_(%s)$" % "|".join(suffixes))
 
-    if experiment_folder is not None:
+    if experiment_folder:
         # summarize 1 experiment in the path
-        summarize_results(experiment_folder, version, path)
+        summarize_results(experiment_folder, version, path, is_validation)
         analyze_answers_from_summary(experiment_folder, version, queries, path)
     else:
-        # summarize all experiments in the path
-        for dirpath, dirnames, _ in os.walk(path):
-            for dirname in dirnames:
-                experiment_path = os.path.join(dirpath, dirname)
-                if "arguments.json" in os.listdir(experiment_path):
-                    print(f"Summarize experiment {experiment_path}")
-                    summarize_results(dirname, version, dirpath, is_validation)
-                    analyze_answers_from_summary(dirname, version, queries, dirpath)
+        # summarize all experiments in the path in parallel processes
+        summarize_all_experiments(version, queries, path, is_validation)
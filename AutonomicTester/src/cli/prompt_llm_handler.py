@@ -1,27 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
 import os
 import re
 import time
+from threading import BoundedSemaphore, Lock
 import ollama
 import pandas as pd
-import huggingface_hub
-import tiktoken
-from transformers import AutoTokenizer
 from javalang.parser import JavaSyntaxError
 
 from src.testexe.iohelper import parse_generated_test_case
 from src.testexe.defects4j_driver import Defects4jDriver
+from src.utils.defects4j_util import prefetch_metadata
 from src.llm.chatgpt.chatgpt_api import prompt_gpt
+from src.llm.response_cache import ResponseCache
 from src import PROMPT_TEMPLATE_PATH
 from src.prompt.fewshots import generate_few_shots_msg
 from src.prompt.prompt import extract_prompt_paths
+from src.prompt.token_index import TokenIndex
 from src.output.output import (
     create_experiment_folder,
     extract_and_save_results,
     summarize_results,
     write_arguments,
 )
+from src.output.results_sink import ResultsSink
 
 from src.llm.llm_kind import LLMKind
 from src.prompt.prompt_kind import PromptKind
@@ -34,6 +37,36 @@ class PromptLlmHandler:
     SYSTEM_MSG_FNAME = "system_message.json"
     TCG_MSG_FNAME = "tcg_message.json"
     RESULTS_FNAME = "results.jsonl"
+    STATS_COLUMNS = [
+        "project_id",
+        "bug_id",
+        "miss_location",
+        "#syntax_fix_times",
+        "has_valid_syntax",
+        "#compilation_fix_times",
+        "can_compile",
+        "#assertion_fix_times",
+        "#failing_tests",
+        "elapsed_nanoseconds",
+        "#characters",
+        "#tokens",
+        "#cache_hits",
+        "#cache_misses",
+    ]
+    # arguments that influence results, which must not change when resuming an experiment
+    RESULT_ARGUMENTS = [
+        "model",
+        "scenario",
+        "version",
+        "dataset",
+        "projects",
+        "queries",
+        "few_shots",
+        "temperature",
+        "seed",
+        "format",
+        "test_case_generation",
+    ]
 
     def __init__(self, args):
         self.client = ollama.Client(host=args.host)
@@ -48,7 +81,24 @@ class PromptLlmHandler:
         self.num_shots = int(args.few_shots)
         self.response_output_format = args.format
         self.enable_tcg = args.test_case_generation == "on"
-        self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.num_workers = args.workers
+        self.llm_semaphore = BoundedSemaphore(self.num_workers)
+        self.num_validation_workers = args.validation_workers
+        self.validation_executor = None
+        self.results_sink = ResultsSink()
+        # guards the prompt log shared by workers
+        self.lock = Lock()
+        self.resume_folder_path = args.resume
+        if self.resume_folder_path is not None:
+            # reuse the timestamp of the interrupted experiment
+            self.timestamp = os.path.basename(
+                os.path.normpath(self.resume_folder_path)
+            )[:15]
+        else:
+            self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.response_cache = None
+        if args.cache == "on":
+            self.response_cache = ResponseCache(float(args.cache_size))
         # Extract prompt paths
         self.prompt_paths = extract_prompt_paths(
             self.dataset,
@@ -56,19 +106,47 @@ class PromptLlmHandler:
             self.version,
             self.projects,
             self.queries,
+            rescan=args.rescan_prompts,
         )
         self._initialize_paths(args)
         self._initialize_few_shots()
+        self._skip_completed_prompts()
+        if self.enable_tcg:
+            # Look up trigger tests of all bugs before spawning Defects4J per attempt
+            project_bugs = []
+            for prompt_path in self.prompt_paths:
+                _, _, bug_id, project_id = self._extract_prompt_metadata(prompt_path)
+                project_bugs.append((project_id, bug_id))
+            prefetch_metadata(project_bugs=project_bugs)
         self._initialize_messages()
-        self._initialize_tokenizer()
+        self._initialize_token_counts()
 
     def _initialize_paths(self, args):
-        self.experiment_results_folder_path = create_experiment_folder(
-            self.chosen_llm, self.chosen_scenario, self.dataset, self.timestamp
-        )
+        if self.resume_folder_path is not None:
+            if not os.path.isdir(self.resume_folder_path):
+                raise ValueError(
+                    f"Experiment folder {self.resume_folder_path} to resume does not exist!"
+                )
+            self.experiment_results_folder_path = self.resume_folder_path
+            self._check_resumed_arguments(args)
+        else:
+            self.experiment_results_folder_path = create_experiment_folder(
+                self.chosen_llm, self.chosen_scenario, self.dataset, self.timestamp
+            )
         self.prompt_log_path = os.path.join(
             self.experiment_results_folder_path, PromptLlmHandler.LOG_FNAME
         )
+        self.statistics_path = os.path.join(
+            self.experiment_results_folder_path, PromptLlmHandler.STATS_FNAME
+        )
+        self.results_path = os.path.join(
+            self.experiment_results_folder_path, PromptLlmHandler.RESULTS_FNAME
+        )
+        if self.resume_folder_path is not None and os.path.exists(
+            self.statistics_path
+        ):
+            # keep arguments and statistics of the interrupted experiment
+            return
         # save complete arguments to a file
         write_arguments(
             self.experiment_results_folder_path,
@@ -76,25 +154,37 @@ class PromptLlmHandler:
             self.chosen_llm.get_intenal_model_name(),
         )
         # Initialize CSV file of statistics
-        self.statistics_path = os.path.join(
-            self.experiment_results_folder_path, PromptLlmHandler.STATS_FNAME
+        pd.DataFrame(columns=PromptLlmHandler.STATS_COLUMNS).to_csv(
+            self.statistics_path, index=False
         )
-        pd.DataFrame(
-            columns=[
-                "project_id",
-                "bug_id",
-                "miss_location",
-                "#syntax_fix_times",
-                "has_valid_syntax",
-                "#compilation_fix_times",
-                "can_compile",
-                "#assertion_fix_times",
-                "#failing_tests",
-                "elapsed_nanoseconds",
-                "#characters",
-                "#tokens",
-            ]
-        ).to_csv(self.statistics_path, index=False)
+
+    def _check_resumed_arguments(self, args):
+        """
+        Raises an error if an argument influencing results differs from the arguments of the experiment to resume.
+        """
+        arguments_path = os.path.join(self.resume_folder_path, "arguments.json")
+        if not os.path.exists(arguments_path):
+            return
+        with open(arguments_path) as f:
+            resumed_arguments = json.load(f)
+        arguments = dict(vars(args), model=self.chosen_llm.get_intenal_model_name())
+        # values are strings if given on the command line and numbers if defaults
+        normalizers = {"few_shots": int, "seed": int, "temperature": float}
+        changed_arguments = []
+        for name in PromptLlmHandler.RESULT_ARGUMENTS:
+            normalize = normalizers.get(name, lambda value: value)
+            if name not in resumed_arguments:
+                # arguments added after the experiment was run
+                continue
+            resumed_value = resumed_arguments[name]
+            if normalize(resumed_value) != normalize(arguments[name]):
+                changed_arguments.append(
+                    f"{name} ({resumed_value} in the experiment, {arguments[name]} now)"
+                )
+        if changed_arguments:
+            raise ValueError(
+                f"Cannot resume {self.resume_folder_path} with different arguments: {', '.join(changed_arguments)}"
+            )
 
     def _initialize_few_shots(self):
         # Extract few shots if enabled
@@ -102,6 +192,69 @@ class PromptLlmHandler:
         if self.num_shots > 0:
             self.few_shots = generate_few_shots_msg(self.num_shots, self.prompt_paths)
 
+    def _skip_completed_prompts(self):
+        """
+        Removes prompts already answered in the experiment folder to resume.
+
+        A prompt is completed when its statistics row is recorded, which is saved after its answer.
+        """
+        if self.resume_folder_path is None:
+            return
+        df_stats = pd.read_csv(self.statistics_path, dtype=str)
+        if list(df_stats.columns) != PromptLlmHandler.STATS_COLUMNS:
+            # statistics of an older run lack newer columns, which appended rows contain
+            df_stats = df_stats.reindex(columns=PromptLlmHandler.STATS_COLUMNS)
+            df_stats.to_csv(self.statistics_path, index=False)
+        completed = set(zip(df_stats["project_id"], df_stats["bug_id"]))
+        if self.response_output_format == "jsonline":
+            answered = set()
+            if os.path.exists(self.results_path):
+                for result in self._read_results():
+                    answered.add((result["project"], result["bug"]))
+            completed &= answered
+        remaining_prompt_paths = []
+        for prompt_path in self.prompt_paths:
+            result_name, _, bug_id, project_id = self._extract_prompt_metadata(
+                prompt_path
+            )
+            if (project_id, bug_id) in completed and (
+                self.response_output_format != "txt"
+                or os.path.exists(
+                    os.path.join(self.experiment_results_folder_path, result_name)
+                )
+            ):
+                continue
+            remaining_prompt_paths.append(prompt_path)
+        print(
+            f"Resume {self.experiment_results_folder_path}: skip {len(self.prompt_paths) - len(remaining_prompt_paths)} completed prompts, {len(remaining_prompt_paths)} prompts remaining"
+        )
+        self.prompt_paths = remaining_prompt_paths
+
+    def _read_results(self) -> list:
+        """
+        Reads the results of the experiment folder to resume.
+
+        A last line truncated by an interrupted write is removed from the file, so that resumed results are appended
+        after the last complete result.
+        """
+        results = []
+        with open(self.results_path, "rb+") as f:
+            end_offset = 0
+            for line in f:
+                try:
+                    results.append(json.loads(line))
+                except ValueError:
+                    if line.endswith(b"\n"):
+                        raise
+                    print(f"Remove truncated last result of {self.results_path}")
+                    f.truncate(end_offset)
+                    break
+                end_offset += len(line)
+                if not line.endswith(b"\n"):
+                    # the result is complete but its line break was not written
+                    f.write(b"\n")
+        return results
+
     def _initialize_messages(self):
         # Extract additional messages for LLM conversation
         # read system message
@@ -115,63 +268,93 @@ class PromptLlmHandler:
         ) as f:
             self.tcg_msg = json.load(f)
 
-    def _initialize_tokenizer(self):
-        # Get Llama tokenizer
-        if self.chosen_llm.is_ollama_model():
-            huggingface_hub.login(os.environ["HUGGING_FACE_API_KEY"])
-            self.tokenizer_encode = AutoTokenizer.from_pretrained(
-                self.chosen_llm.get_hf_model_name()
-            ).tokenize
-        elif self.chosen_llm is LLMKind.GPT4o:
-            self.tokenizer_encode = tiktoken.encoding_for_model("gpt-4o").encode
-        elif (
-            self.chosen_llm is LLMKind.GPT3FT
-            or self.chosen_llm is LLMKind.GPT3turbo
-            or self.chosen_llm is LLMKind.GPT4
-            or self.chosen_llm is LLMKind.GPT4turbo
-        ):
-            self.tokenizer_encode = tiktoken.get_encoding("cl100k_base").encode
-        else:
-            self.tokenizer_encode = None
+    def _initialize_token_counts(self):
+        # Look up token counts of all prompts in the token index instead of tokenizing them per run
+        self.prompt_num_tokens = None
+        tokenizer_id = self.chosen_llm.get_tokenizer_id()
+        if tokenizer_id is not None:
+            self.prompt_num_tokens = TokenIndex().count_file_tokens(
+                tokenizer_id, self.prompt_paths
+            )
 
-    def _prompt_llm(self, chat_msgs: list) -> str:
+    def _prompt_llm(self, chat_msgs: list, prompt_stats: dict) -> str:
         """
         Wraps LLM prompting API in a single function
         """
         if self.chosen_llm.is_ollama_model():
-            response = self.client.chat(
-                model=self.chosen_llm.get_intenal_model_name(),
-                messages=chat_msgs,
-                options={
-                    "seed": self.seed,
-                    "temperature": self.temperature,
-                    "num_ctx": self.chosen_llm.get_context_limit(),
-                },
-                stream=False,
-            )
+            response, _ = self._chat_ollama(chat_msgs, prompt_stats)
             return response["message"]["content"]
         elif self.chosen_llm.is_gpt_model():
-            response = prompt_gpt(
-                self.chosen_llm.get_intenal_model_name(),
-                chat_msgs,
-                self.seed,
-                self.temperature,
-            )
-            return response.content
+            response, _ = self._chat_gpt(chat_msgs, prompt_stats)
+            return response["content"]
 
-    def _prompt_llama_model(
-        self, messages, bug_id, project_id, prompt_stats: dict
-    ):
-        scenario_response = self.client.chat(
-            model=self.chosen_llm.get_intenal_model_name(),
-            messages=messages,
-            options={
+    def _chat_ollama(self, chat_msgs: list, prompt_stats: dict, format=None) -> tuple:
+        request = {
+            "model": self.chosen_llm.get_intenal_model_name(),
+            "messages": chat_msgs,
+            "options": {
                 "seed": self.seed,
                 "temperature": self.temperature,
                 "num_ctx": self.chosen_llm.get_context_limit(),
             },
-            stream=False,
-            format=Answer.model_json_schema(),
+            "stream": False,
+            "format": format,
+        }
+        return self._cached_call(
+            request,
+            lambda: self.client.chat(**request).model_dump(),
+            prompt_stats,
+        )
+
+    def _chat_gpt(self, chat_msgs: list, prompt_stats: dict) -> tuple:
+        request = {
+            "model": self.chosen_llm.get_intenal_model_name(),
+            "messages": chat_msgs,
+            "seed": self.seed,
+            "temperature": self.temperature,
+        }
+        return self._cached_call(
+            request,
+            lambda: prompt_gpt(**request).model_dump(),
+            prompt_stats,
+        )
+
+    def _cached_call(self, request: dict, compute, prompt_stats: dict) -> tuple:
+        """
+        Sends a request to the LLM unless its response is found in the response cache.
+
+        Returns
+        -------
+        tuple(dict, int) : the response and the nanoseconds taken by the LLM request, excluding the wait
+        for a free slot of concurrent requests, or 0 for a cached response
+        """
+        elapsed_nanoseconds = 0
+
+        def compute_with_limit():
+            nonlocal elapsed_nanoseconds
+            # bound the number of concurrent LLM requests
+            with self.llm_semaphore:
+                t_init = time.time_ns()
+                response = compute()
+                elapsed_nanoseconds = time.time_ns() - t_init
+            return response
+
+        if self.response_cache is None:
+            return compute_with_limit(), elapsed_nanoseconds
+        response, is_hit = self.response_cache.get_or_compute(
+            request, compute_with_limit
+        )
+        if is_hit:
+            prompt_stats["#cache_hits"] += 1
+        else:
+            prompt_stats["#cache_misses"] += 1
+        return response, elapsed_nanoseconds
+
+    def _prompt_llama_model(
+        self, messages, bug_id, project_id, prompt_stats: dict
+    ):
+        scenario_response, _ = self._chat_ollama(
+            messages, prompt_stats, format=Answer.model_json_schema()
         )
         # store response metrics
         prompt_stats["elapsed_nanoseconds"] = scenario_response["total_duration"]
@@ -192,20 +375,14 @@ class PromptLlmHandler:
         self, messages, bug_id, project_id, prompt_stats: dict
     ):
         # Measure the time taken to process each prompt
-        t_init = time.time_ns()
-        response_msg = prompt_gpt(
-            self.chosen_llm.get_intenal_model_name(),
-            messages,
-            self.temperature,
-        )
-        response = response_msg.content
-        elapsed_nanoseconds = time.time_ns() - t_init
+        response_msg, elapsed_nanoseconds = self._chat_gpt(messages, prompt_stats)
+        response = response_msg["content"]
         prompt_stats["elapsed_nanoseconds"] = elapsed_nanoseconds
         generated_test_case = None
         # continue conversation with test case generation
         if self.enable_tcg:
             chat_msgs = messages + [
-                {"role": "assistant", "content": response_msg.content},
+                {"role": "assistant", "content": response},
                 self.tcg_msg,
             ]
             generated_test_case = self._check_validity(
@@ -239,7 +416,7 @@ class PromptLlmHandler:
             and compilation_fix_times < MAX_RETRY
             and assertion_fix_times < MAX_RETRY
         ):
-            tcg_response = self._prompt_llm(chat_msgs)
+            tcg_response = self._prompt_llm(chat_msgs, prompt_stats)
             try:
                 generated_test_case = parse_generated_test_case(tcg_response)
                 if generated_test_case is None:
@@ -252,15 +429,19 @@ class PromptLlmHandler:
                 else:
                     has_valid_syntax = True
                     # check if compile
-                    driver = Defects4jDriver(bug_id, project_id, self.timestamp)
-                    aug_state = driver.augment_test_suite_with_generated_test_case(
-                        generated_test_case
-                    )
-                    if aug_state is None:
+                    if self.validation_executor is not None:
+                        # queue the validation to Defects4J workers and continue once it returns
+                        is_augmented, exe_result = self.validation_executor.submit(
+                            self._validate_test_case, bug_id, project_id, generated_test_case
+                        ).result()
+                    else:
+                        is_augmented, exe_result = self._validate_test_case(
+                            bug_id, project_id, generated_test_case
+                        )
+                    if not is_augmented:
                         # fail to add test case to test suite because fail to locate the trigger test case
                         miss_location = True
                         break
-                    exe_result = driver.evaluate_test_execution()
                     if isinstance(exe_result, str):
                         # compilation error
                         exe_result = self._compress_compilation_msg(exe_result)
@@ -307,73 +488,117 @@ class PromptLlmHandler:
         prompt_stats["#failing_tests"] = num_failing_tests
         return generated_test_case
 
+    def _validate_test_case(self, bug_id: str, project_id: str, generated_test_case: str) -> tuple:
+        """
+        Adds the generated test case to the test suites of both versions and executes it in the buggy version.
+
+        Returns
+        -------
+        tuple(bool, int | str | None) : whether the trigger test case is found and the execution result
+        """
+        driver = Defects4jDriver(bug_id, project_id, self.timestamp)
+        aug_state = driver.augment_test_suite_with_generated_test_case(
+            generated_test_case
+        )
+        if aug_state is None:
+            return False, None
+        return True, driver.evaluate_test_execution()
+
     def start_prompting(self):
         """
         Entry point for prompting experiments.
         """
-        # Iterate over prompts and query LLM
-        for i, prompt_path in enumerate(self.prompt_paths):
-            print(f"{i + 1} - {prompt_path}")
-            # Read prompt texts
-            with open(prompt_path, "r", encoding="utf-8") as f:
-                prompt = f.read()
-            # Check token limit
-            num_tokens = -1
-            if self.tokenizer_encode:
-                num_tokens = len(self.tokenizer_encode(prompt))
-                if num_tokens > self.chosen_llm.get_context_limit():
-                    with open(self.prompt_log_path, "a") as f:
-                        f.write(f"Ignore {prompt_path} due to context limit!\n")
-                    continue
-            # Extract project metadata
-            result_name, tcg_name, bug_id, project_id = self._extract_prompt_metadata(
-                prompt_path
+        num_conversations = self.num_workers
+        if self.enable_tcg and self.num_validation_workers > 0:
+            # Pipeline LLM generation and Defects4J validation in separate pools, keeping
+            # enough conversations in flight for both pools to stay busy
+            self.validation_executor = ThreadPoolExecutor(
+                max_workers=self.num_validation_workers
             )
-
-            # Construct messages for LLM prompting
-            messages = [self.system_msg]
-            if self.few_shots is not None:
-                messages += self.few_shots
-            messages += [{"role": "user", "content": prompt}]
-            print(f"Waiting for response from {self.chosen_llm.value}...")
-            prompt_stats = {
-                "project_id": project_id,
-                "bug_id": bug_id,
-                "miss_location": None,
-                "#syntax_fix_times": None,
-                "has_valid_syntax": None,
-                "#compilation_fix_times": None,
-                "can_compile": None,
-                "#assertion_fix_times": None,
-                "#failing_tests": None,
-            }
-            # Send requests with messages to prompt LLM
-            try:
-                if self.chosen_llm.is_gpt_model():
-                    response, tcg_response = self._prompt_gpt_model(
-                        messages, bug_id, project_id, prompt_stats
-                    )
-                elif self.chosen_llm.is_ollama_model():
-                    response, tcg_response, num_tokens = self._prompt_llama_model(
-                        messages, bug_id, project_id, prompt_stats
-                    )
-            except Exception as e:
-                print(e)
-                continue
-            # Save responses and statistics of prompting
-            self._save_results(
-                project_id,
-                bug_id,
-                response,
-                result_name,
-                tcg_response,
-                tcg_name,
-                prompt,
-                num_tokens,
-                prompt_stats,
+            num_conversations += self.num_validation_workers
+        # Dispatch prompts to a pool of workers and save results in the order of prompt paths
+        with self.results_sink, ThreadPoolExecutor(
+            max_workers=num_conversations
+        ) as executor:
+            prompt_results = executor.map(
+                self._prompt_single, range(len(self.prompt_paths)), self.prompt_paths
             )
+            for prompt_result in prompt_results:
+                if prompt_result is None:
+                    continue
+                # Save responses and statistics of prompting
+                self._save_results(**prompt_result)
+        if self.validation_executor is not None:
+            self.validation_executor.shutdown()
+            self.validation_executor = None
         print("Results are saved to " + self.experiment_results_folder_path)
 
+    def _prompt_single(self, i: int, prompt_path: str) -> dict | None:
+        """
+        Prompts the LLM with a single prompt file and returns the arguments to save its results.
+        """
+        print(f"{i + 1} - {prompt_path}")
+        # Read prompt texts
+        with open(prompt_path, "r", encoding="utf-8") as f:
+            prompt = f.read()
+        # Check token limit
+        num_tokens = -1
+        if self.prompt_num_tokens is not None:
+            num_tokens = self.prompt_num_tokens[prompt_path]
+            if num_tokens > self.chosen_llm.get_context_limit():
+                with self.lock:
+                    with open(self.prompt_log_path, "a") as f:
+                        f.write(f"Ignore {prompt_path} due to context limit!\n")
+                return None
+        # Extract project metadata
+        result_name, tcg_name, bug_id, project_id = self._extract_prompt_metadata(
+            prompt_path
+        )
+
+        # Construct messages for LLM prompting
+        messages = [self.system_msg]
+        if self.few_shots is not None:
+            messages += self.few_shots
+        messages += [{"role": "user", "content": prompt}]
+        print(f"Waiting for response from {self.chosen_llm.value}...")
+        prompt_stats = {
+            "project_id": project_id,
+            "bug_id": bug_id,
+            "miss_location": None,
+            "#syntax_fix_times": None,
+            "has_valid_syntax": None,
+            "#compilation_fix_times": None,
+            "can_compile": None,
+            "#assertion_fix_times": None,
+            "#failing_tests": None,
+            "#cache_hits": 0,
+            "#cache_misses": 0,
+        }
+        # Send requests with messages to prompt LLM
+        try:
+            if self.chosen_llm.is_gpt_model():
+                response, tcg_response = self._prompt_gpt_model(
+                    messages, bug_id, project_id, prompt_stats
+                )
+            elif self.chosen_llm.is_ollama_model():
+                response, tcg_response, num_tokens = self._prompt_llama_model(
+                    messages, bug_id, project_id, prompt_stats
+                )
+        except Exception as e:
+            print(e)
+            return None
+        return {
+            "project_id": project_id,
+            "bug_id": bug_id,
+            "response": response,
+            "result_name": result_name,
+            "tcg_response": tcg_response,
+            "tcg_name": tcg_name,
+            "prompt": prompt,
+            "num_tokens": num_tokens,
+            "prompt_stats": prompt_stats,
+        }
+
     def _extract_prompt_metadata(self, prompt_path):
         prompt_name = os.path.basename(prompt_path)
         result_name = prompt_name[:-4] + "_result.txt"
@@ -405,16 +630,10 @@ class PromptLlmHandler:
                 response, os.path.join(self.experiment_results_folder_path, result_name)
             )
         elif self.response_output_format == "jsonline":
-            with open(
-                os.path.join(self.experiment_results_folder_path, PromptLlmHandler.RESULTS_FNAME),
-                "a",
-            ) as f:
-                f.write(
-                    json.dumps(
-                        {"project": project_id, "bug": bug_id, "response": response}
-                    )
-                    + "\n"
-                )
+            self.results_sink.write_jsonl(
+                self.results_path,
+                {"project": project_id, "bug": bug_id, "response": response},
+            )
         # store generate test case
         if tcg_response:
             extract_and_save_results(
@@ -424,11 +643,8 @@ class PromptLlmHandler:
         # record statistics
         prompt_stats["#characters"] = sum(len(word) for word in prompt.split())
         prompt_stats["#tokens"] = num_tokens
-        pd.DataFrame([prompt_stats]).to_csv(
-            self.statistics_path,
-            mode="a",
-            index=False,
-            header=False,
+        self.results_sink.write_csv_row(
+            self.statistics_path, prompt_stats, PromptLlmHandler.STATS_COLUMNS
         )
 
     def _compress_compilation_msg(self, compile_msg):
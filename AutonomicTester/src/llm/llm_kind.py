@@ -119,6 +119,18 @@ class LLMKind(Enum):
         else:
             raise ValueError(f"Enum member {self} not found in HuggingFace models.")
 
+    def get_tokenizer_id(self) -> str | None:
+        """
+        Returns the ID of the tokenizer used to count prompt tokens, or None if not supported.
+        """
+        if self.is_ollama_model():
+            return f"huggingface/{self.get_hf_model_name()}"
+        elif self is LLMKind.GPT4o:
+            return "tiktoken/o200k_base"
+        elif self in [LLMKind.GPT3FT, LLMKind.GPT3turbo, LLMKind.GPT4, LLMKind.GPT4turbo]:
+            return "tiktoken/cl100k_base"
+        return None
+
     def is_ollama_model(self):
         return (
             "LLama" in self.name or "Deepseek" in self.name
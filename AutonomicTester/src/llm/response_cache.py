@@ -0,0 +1,134 @@
+"""
+File to cache LLM responses on disk across experiments.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from threading import Lock
+
+from src import LLM_CACHE_PATH
+
+
+class ResponseCache:
+    """
+    SQLite cache of LLM responses keyed by a stable hash of the complete request.
+
+    The least recently used responses are evicted once the cached responses exceed the size limit.
+    """
+
+    def __init__(self, max_size_mb: float, path: str = LLM_CACHE_PATH):
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.path = path
+        # the connection is shared by prompting workers
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT, size INTEGER, last_access INTEGER)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+            # running total size of cached responses, kept in the database shared by experiments
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value INTEGER)"
+            )
+            self.connection.execute(
+                "INSERT OR IGNORE INTO metadata "
+                "SELECT 'total_size', COALESCE(SUM(size), 0) FROM responses"
+            )
+
+    @staticmethod
+    def hash_request(request: dict) -> str:
+        """
+        Hashes a request with all parameters influencing the response, e.g., model, messages, seed, temperature and format.
+        """
+        request_str = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(request_str.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT response FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time_ns(), key),
+            )
+        return json.loads(row[0])
+
+    def put(self, key: str, response):
+        response_str = json.dumps(response, default=str)
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            replaced_size = 0 if row is None else row[0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, response_str, len(response_str), time.time_ns()),
+            )
+            total_size = self._add_total_size(len(response_str) - replaced_size)
+            if total_size > self.max_size_bytes:
+                self._evict(total_size)
+
+    def get_or_compute(self, request: dict, compute) -> tuple:
+        """
+        Returns the cached response of the request or computes and caches it.
+
+        Returns
+        -------
+        tuple(response, bool) : the response and whether it was a cache hit
+        """
+        key = ResponseCache.hash_request(request)
+        response = self.get(key)
+        if response is not None:
+            return response, True
+        response = compute()
+        self.put(key, response)
+        return response, False
+
+    async def aget_or_compute(self, request: dict, acompute) -> tuple:
+        """
+        Returns the cached response of the request or awaits the coroutine function acompute to compute and cache it.
+
+        Returns
+        -------
+        tuple(response, bool) : the response and whether it was a cache hit
+        """
+        key = ResponseCache.hash_request(request)
+        response = self.get(key)
+        if response is not None:
+            return response, True
+        response = await acompute()
+        self.put(key, response)
+        return response, False
+
+    def _add_total_size(self, delta: int) -> int:
+        self.connection.execute(
+            "UPDATE metadata SET value = value + ? WHERE name = 'total_size'", (delta,)
+        )
+        return self.connection.execute(
+            "SELECT value FROM metadata WHERE name = 'total_size'"
+        ).fetchone()[0]
+
+    def _evict(self, total_size: int):
+        """
+        Deletes the least recently used responses until the cached responses fit in the size limit.
+        """
+        evicted_keys = []
+        evicted_size = 0
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ):
+            if total_size - evicted_size <= self.max_size_bytes:
+                break
+            evicted_keys.append((key,))
+            evicted_size += size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+        self._add_total_size(-evicted_size)
@@ -8,7 +8,6 @@ import re
 import os
 import pandas as pd
 from datetime import datetime
-import matplotlib.pyplot as plt
 from src.llm.llm_kind import LLMKind
 from src.prompt.prompt_kind import PromptKind
 from src import (
@@ -86,6 +85,8 @@ def plot_results(results, directory):
     """
     Plot the results of the analysis.
     """
+    import matplotlib.pyplot as plt
+
     # Prepare subplots
     _, axes = plt.subplots(2, 2, figsize=(10, 10))
     axes = axes.flatten()
@@ -126,6 +127,7 @@ def plot_results_from_summary(experiment_folder, prompt_version, plot_table):
     """
     Plot the results of the analysis.
     """
+    import matplotlib.pyplot as plt
 
     if experiment_folder.endswith("buggy"):
         prompt_kind = PromptKind.BUGGY
@@ -238,48 +240,74 @@ def plot_results_from_summary(experiment_folder, prompt_version, plot_table):
     # plt.show(block=False)
 
 
-def summarize_results(directory, version, path, is_validation=False):
-    results = []
-    # read prompts for validation
+def read_validation_prompts():
+    """
+    Reads names of prompts for validation without the .txt suffix.
+    """
     with open(FINE_TUNE_LLM_VALIDATION_PATH) as f:
         validation_paths = json.load(f)
-        validation_prompts = [os.path.basename(p)[:-4] for p in validation_paths]
+    return {os.path.basename(p)[:-4] for p in validation_paths}
+
+
+def parse_results(directory, version, path, validation_prompts=None):
+    """
+    Parses answers from all result files in an experiment folder.
+
+    Parameters
+    ----------
+    - validation_prompts : set of prompt names to consider only, or None to consider all prompts
 
+    Returns
+    -------
+    list : a list of answers with the result file name as id
+    """
+    results = []
     for fn in os.listdir(os.path.join(path, directory)):
         if "result.txt" not in fn:
             continue
-        if is_validation and fn.removesuffix("_result.txt") not in validation_prompts:
+        if (
+            validation_prompts is not None
+            and fn.removesuffix("_result.txt") not in validation_prompts
+        ):
             continue
         with open(os.path.join(path, directory, fn)) as f:
-            if version == "4":
-                result = f.read()
-                pattern = r"{(\s*\"Q\d\":\s*\".*?\",?\s*)+}"
-                match = re.search(pattern, result)
-                if match:
-                    try:
-                        result = json.loads(match.group(0))
-                        result["id"] = fn
-                        results.append(result)
-                    except:
-                        print("Fail to parse to json", fn)
-            elif version in ["2", "3"]:
-                pattern = r"\[ANSWER\][^\[]*(YES|NO)[^\[]*\[\/ANSWER\]"
-                matches = re.findall(pattern, result)
-                # Extract the content if a match is found
-                if matches:
-                    result = {"id": fn}
-                    for i, answer in enumerate(matches, 1):
-                        question_id = f"Q{i}"
-                        result[question_id] = answer
+            result = f.read()
+        if version == "4":
+            pattern = r"{(\s*\"Q\d\":\s*\".*?\",?\s*)+}"
+            match = re.search(pattern, result)
+            if match:
+                try:
+                    result = json.loads(match.group(0))
+                    result["id"] = fn
                     results.append(result)
-                else:
-                    logging.warning(
-                        f"Ignore {fn} because fail to match answers between [ANSWER] and [/ANSWER]! Please fix them and run summarize again to include more results."
-                    )
+                except:
+                    print("Fail to parse to json", fn)
+        elif version in ["2", "3"]:
+            pattern = r"\[ANSWER\][^\[]*(YES|NO)[^\[]*\[\/ANSWER\]"
+            matches = re.findall(pattern, result)
+            # Extract the content if a match is found
+            if matches:
+                result = {"id": fn}
+                for i, answer in enumerate(matches, 1):
+                    question_id = f"Q{i}"
+                    result[question_id] = answer
+                results.append(result)
             else:
-                raise ValueError(f"Illegal prompt template version {version}!")
+                logging.warning(
+                    f"Ignore {fn} because fail to match answers between [ANSWER] and [/ANSWER]! Please fix them and run summarize again to include more results."
+                )
+        else:
+            raise ValueError(f"Illegal prompt template version {version}!")
+    return results
+
+
+def summarize_results(directory, version, path, is_validation=False):
+    # read prompts for validation
+    validation_prompts = read_validation_prompts() if is_validation else None
+    results = parse_results(directory, version, path, validation_prompts)
     with open(os.path.join(path, directory, "summary.json"), "w") as f:
         f.write(json.dumps(results, sort_keys=True, indent=4))
+    return results
 
 
 def write_arguments(experiment_folder_path, args, model_name):
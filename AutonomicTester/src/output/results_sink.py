@@ -0,0 +1,97 @@
+"""
+File to write experiment results through long-lived buffered file handles.
+"""
+
+import csv
+import json
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class ResultsSink:
+    """
+    Appends JSON lines and CSV rows to result files shared by workers.
+
+    Files stay open across writes and are flushed and synced to disk together every
+    flush_every records or flush_seconds seconds, and when the sink is closed.
+    At most max_open_files files are kept open, closing the least recently written ones.
+    """
+
+    def __init__(self, flush_every: int = 100, flush_seconds: float = 5.0, max_open_files: int = 32):
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.max_open_files = max_open_files
+        self.files = OrderedDict()  # open files by path in the order of last write
+        self.num_pending_records = 0
+        self.last_flush_time = time.monotonic()
+        # guards files shared by workers
+        self.lock = Lock()
+
+    def write_line(self, path: str, line: str):
+        with self.lock:
+            self._get_file(path).write(line + "\n")
+            self._record_written()
+
+    def write_jsonl(self, path: str, record: dict):
+        self.write_line(path, json.dumps(record))
+
+    def write_csv_row(self, path: str, row: dict, columns: list):
+        """
+        Appends a row with the given columns, writing missing or None values as empty fields like pandas.
+        """
+        values = [row.get(column) for column in columns]
+        with self.lock:
+            csv.writer(self._get_file(path), lineterminator="\n").writerow(
+                ["" if value is None else value for value in values]
+            )
+            self._record_written()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            for f in self.files.values():
+                f.close()
+            self.files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get_file(self, path: str):
+        if path in self.files:
+            self.files.move_to_end(path)
+            return self.files[path]
+        if len(self.files) >= self.max_open_files:
+            _, least_recent_file = self.files.popitem(last=False)
+            ResultsSink._sync(least_recent_file)
+            least_recent_file.close()
+        # newline="" lets the csv writer control line endings
+        self.files[path] = open(path, "a", encoding="utf-8", newline="")
+        return self.files[path]
+
+    def _record_written(self):
+        self.num_pending_records += 1
+        if (
+            self.num_pending_records >= self.flush_every
+            or time.monotonic() - self.last_flush_time >= self.flush_seconds
+        ):
+            self._flush()
+
+    def _flush(self):
+        for f in self.files.values():
+            ResultsSink._sync(f)
+        self.num_pending_records = 0
+        self.last_flush_time = time.monotonic()
+
+    @staticmethod
+    def _sync(f):
+        f.flush()
+        os.fsync(f.fileno())
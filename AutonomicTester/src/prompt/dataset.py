@@ -7,7 +7,7 @@ from src.prompt.prompt import (
     search_prompts_from_defects4j,
 )
 from src.prompt.prompt_kind import PromptKind
-import tiktoken
+from src.prompt.token_index import TokenIndex
 import numpy as np
 from collections import defaultdict
 import jsonlines
@@ -16,6 +16,8 @@ import pandas as pd
 MAX_TOKEN_SIZE = 16000
 FINE_TUNE_PERCENTAGE = 0.05
 NUM_FINE_TUNE_SAMPLE_PER_SCENARIO = 20
+# Encoding of GPT-3.5 Turbo
+FINE_TUNE_TOKENIZER_ID = "tiktoken/cl100k_base"
 
 
 def organize_prompts_by_project(prompt_paths):
@@ -40,7 +42,7 @@ def generate_messages(
     validation_paths,
     answers,
     system_msg,
-    enc,
+    prompt_num_tokens,
     num_fine_tuning_samples_per_scenario,
     prompt_paths,
 ):
@@ -58,7 +60,7 @@ def generate_messages(
             prompt_path = prompt_paths_by_project[project_id][current_index]
             with open(prompt_path) as prompt_file:
                 prompt = prompt_file.read()
-            num_tokens = len(enc.encode(prompt))
+            num_tokens = prompt_num_tokens[prompt_path]
             if (
                 num_tokens < MAX_TOKEN_SIZE
                 and num_samples < num_fine_tuning_samples_per_scenario
@@ -109,7 +111,15 @@ def create_fine_tuning_dataset(version, projects, source_datasets):
                     prompt_kind, projects, version
                 )
     # Create fine-tuning dataset
-    enc = tiktoken.encoding_for_model("gpt-3.5-turbo")
+    token_index = TokenIndex()
+    prompt_num_tokens = {}
+    for dataset in prompt_paths:
+        for prompt_kind in list(PromptKind):
+            prompt_num_tokens.update(
+                token_index.count_file_tokens(
+                    FINE_TUNE_TOKENIZER_ID, prompt_paths[dataset][prompt_kind]
+                )
+            )
     fine_tuning_dataset = []
     validation_paths = []
     fine_tune_stats = []
@@ -130,7 +140,7 @@ def create_fine_tuning_dataset(version, projects, source_datasets):
                 validation_paths,
                 all_answers[prompt_kind.name],
                 system_msg,
-                enc,
+                prompt_num_tokens,
                 NUM_FINE_TUNE_SAMPLE_PER_SCENARIO,
                 prompt_paths[dataset][prompt_kind],
             )
@@ -138,7 +148,7 @@ def create_fine_tuning_dataset(version, projects, source_datasets):
             stats["dataset"] = dataset
             fine_tune_stats.append(stats)
     pd.DataFrame(fine_tune_stats).to_csv("fine_tuning_stats.csv", index=False)
-    check_fine_tuning_dataset(fine_tuning_dataset)
+    check_fine_tuning_dataset(fine_tuning_dataset, token_index)
     # Store fine-tuning dataset as JSONL
     with jsonlines.open(f"fine_tuning_dataset_v{version}.jsonl", "w") as writer:
         writer.write_all(fine_tuning_dataset)
@@ -147,7 +157,7 @@ def create_fine_tuning_dataset(version, projects, source_datasets):
         json.dump(validation_paths, f, indent=4)
 
 
-def check_fine_tuning_dataset(dataset):
+def check_fine_tuning_dataset(dataset, token_index=None):
     # Copied from https://cookbook.openai.com/examples/chat_finetuning_data_prep
     print("Num examples:", len(dataset))
     # Format error checks
@@ -197,14 +207,27 @@ def check_fine_tuning_dataset(dataset):
     else:
         print("No errors found")
 
-    encoding = tiktoken.get_encoding("cl100k_base")
+    # Count tokens of all distinct message values at once
+    if token_index is None:
+        token_index = TokenIndex()
+    values = list(
+        {
+            value
+            for ex in dataset
+            for message in ex["messages"]
+            for value in message.values()
+        }
+    )
+    value_num_tokens = dict(
+        zip(values, token_index.count_tokens(FINE_TUNE_TOKENIZER_ID, values))
+    )
 
     def num_tokens_from_messages(messages, tokens_per_message=3, tokens_per_name=1):
         num_tokens = 0
         for message in messages:
             num_tokens += tokens_per_message
             for key, value in message.items():
-                num_tokens += len(encoding.encode(value))
+                num_tokens += value_num_tokens[value]
                 if key == "name":
                     num_tokens += tokens_per_name
         num_tokens += 3
@@ -214,7 +237,7 @@ def check_fine_tuning_dataset(dataset):
         num_tokens = 0
         for message in messages:
             if message["role"] == "assistant":
-                num_tokens += len(encoding.encode(message["content"]))
+                num_tokens += value_num_tokens[message["content"]]
         return num_tokens
 
     def print_distribution(values, name):
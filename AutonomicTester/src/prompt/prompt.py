@@ -2,12 +2,16 @@
 This file contains the main function to create prompts.
 """
 
+import hashlib
 import logging
 import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 import re
 import os
 from src.prompt.prompt_kind import PromptKind
+from src.prompt.prompt_catalog import PromptCatalog
 from src import (
     DEFACTS4J_PATH,
     LLAMA3_CONTEXT_LIMIT,
@@ -33,44 +37,119 @@ class Prompt:
         template_version: int,
         scenario_kind: PromptKind,
         queries: list[str],
+        template_json: dict = None,
     ):
         self.project = project
         self.bug = bug
         self.template_version = template_version
         self.scenario_kind = scenario_kind
         self.queries = queries
+        # parsed template shared by prompts of a builder
+        if template_json is None:
+            template_json = Prompt.load_template(template_version)
+        self.template_json = template_json
+        self.prompt_hash = None  # SHA-256 hash of the generated prompt
+
+    def generate(
+        self, components_path: str, prompts_path: str, components_cache: dict = None
+    ) -> bool:
+        """
+        Generates the prompt and writes it only if its content changed.
 
-    def generate(self, components_path: str, prompts_path: str):
-        prompt_name = f"prompt_{self.scenario_kind.name.lower()}_{self.bug}_{self.project}_v{self.template_version}.txt"
+        Returns
+        -------
+        bool : whether the prompt file was written
+        """
+        prompt_name = self.get_prompt_name()
         prompt_path = os.path.join(prompts_path, prompt_name)
         prompt = Prompt.create_prompt(
-            self.template_version,
+            self.template_json,
             self.queries,
             *Prompt.extract_prompt_components(
-                self.scenario_kind, self.project, self.bug, components_path
+                self.scenario_kind,
+                self.project,
+                self.bug,
+                components_path,
+                components_cache,
             ),
         )
         # check if prompt is valid
         if prompt is None:
-            return
+            return False
         if len(prompt) > LLAMA3_CONTEXT_LIMIT:
             logging.warning(
                 f"{prompt_name} has too many characters ({len(prompt)} > 8K)"
             )
         # store generated prompt
-        with open(prompt_path, "w") as f:
-            f.write(prompt.strip())
+        prompt = prompt.strip()
+        self.prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return write_if_changed(prompt_path, prompt)
+
+    def get_prompt_name(self) -> str:
+        return f"prompt_{self.scenario_kind.name.lower()}_{self.bug}_{self.project}_v{self.template_version}.txt"
+
+    def get_input_hashes(
+        self, components_path: str, components_cache: dict, previous_inputs: dict = None
+    ) -> dict | None:
+        """
+        Hashes the component files of the prompt, reusing previous hashes of files with unchanged mtime and size.
+
+        Parameters
+        ----------
+        - components_path : str
+        - components_cache : dict
+            contents of component files read for other scenarios of the bug, filled with files read for hashing
+        - previous_inputs : dict
+            the inputs of the prompt in the manifest of the last generation
+
+        Returns
+        -------
+        dict : a mapping from component names to their mtime in nanoseconds, size and SHA-256 hash, None if a component is missing
+        """
+        if previous_inputs is None:
+            previous_inputs = {}
+        inputs = {}
+        for component in Prompt.get_prompt_component(self.scenario_kind):
+            component_path = os.path.join(components_path, component.name + ".txt")
+            try:
+                stat = os.stat(component_path)
+            except FileNotFoundError:
+                return None
+            previous_input = previous_inputs.get(component.name)
+            if previous_input is not None and previous_input[:2] == [
+                stat.st_mtime_ns,
+                stat.st_size,
+            ]:
+                inputs[component.name] = previous_input
+                continue
+            if components_cache.get(component.name) is None:
+                with open(component_path) as f:
+                    components_cache[component.name] = f.read()
+            inputs[component.name] = [
+                stat.st_mtime_ns,
+                stat.st_size,
+                hashlib.sha256(
+                    components_cache[component.name].encode("utf-8")
+                ).hexdigest(),
+            ]
+        return inputs
+
+    @staticmethod
+    def load_template(version) -> dict:
+        with open(os.path.join(PROMPT_TEMPLATE_PATH, f"template_v{version}.json")) as f:
+            return json.load(f)
 
     @staticmethod
     def create_prompt(
-        version, queries, function_candidate, existing_test_cases, new_scenario
+        template_json, queries, function_candidate, existing_test_cases, new_scenario
     ):
         """
         Generate a structured prompt with variable sections for autonomic testing.
 
         Parameters
         ----------
-        - version : str
+        - template_json : dict
+            the parsed template of the prompt version
         - queries : list
             the selection of queries to create the prompting text
         - function_candidate : str
@@ -89,8 +168,6 @@ class Prompt:
         ):
             return None
 
-        with open(os.path.join(PROMPT_TEMPLATE_PATH, f"template_v{version}.json")) as f:
-            template_json = json.load(f)
         task = template_json["task"]
         prompt = f"""
 MUT:
@@ -118,7 +195,20 @@ TASK:
         return prompt
 
     @staticmethod
-    def extract_prompt_components(prompt_kind, project, bug_id, component_folder_path):
+    def get_prompt_component(prompt_kind):
+        if prompt_kind is PromptKind.BUGGY:
+            return BuggyUnitPromptComponent
+        elif prompt_kind is PromptKind.FIXED:
+            return FixedUnitPromptComponent
+        elif prompt_kind is PromptKind.SIMILAR:
+            return SimilarUnitPromptComponent
+        else:
+            raise ValueError(f"PromptKind {prompt_kind} is not supported!")
+
+    @staticmethod
+    def extract_prompt_components(
+        prompt_kind, project, bug_id, component_folder_path, components_cache=None
+    ):
         """
         Extract the components for each field prompt.
 
@@ -127,28 +217,31 @@ TASK:
         - prompt_kind : PromptKind
         - project : str
         - bug_id : str
+        - component_folder_path : str
+        - components_cache : dict
+            contents of component files already read for other scenarios of the bug, None if missing
 
         Returns
         -------
         tuple(str, str, str)
         """
         components = {}
-        if prompt_kind is PromptKind.BUGGY:
-            prompt_component = BuggyUnitPromptComponent
-        elif prompt_kind is PromptKind.FIXED:
-            prompt_component = FixedUnitPromptComponent
-        elif prompt_kind is PromptKind.SIMILAR:
-            prompt_component = SimilarUnitPromptComponent
-        else:
-            raise ValueError(f"PromptKind {prompt_kind} is not supported!")
+        prompt_component = Prompt.get_prompt_component(prompt_kind)
+        if components_cache is None:
+            components_cache = {}
         # Read relevant components
         for component in prompt_component:
             component_path = os.path.join(
                 component_folder_path, component.name + ".txt"
             )
-            if os.path.exists(component_path):
-                with open(component_path) as f:
-                    components[component.value] = f.read()
+            if component.name not in components_cache:
+                try:
+                    with open(component_path) as f:
+                        components_cache[component.name] = f.read()
+                except FileNotFoundError:
+                    components_cache[component.name] = None
+            if components_cache[component.name] is not None:
+                components[component.value] = components_cache[component.name]
             else:
                 logging.warning(
                     f"Skip {prompt_kind.name} prompt of project {project} bug {bug_id} because component path {component_path} does not exist."
@@ -172,18 +265,34 @@ class PromptBuilder:
         "PromptDataset"  # path to store testing scenario prompts for LLM
     )
     Defects4AT_PROJECTS = ["spring-boot", "shardingsphere", "dolphinscheduler", "micrometer"]
+    MANIFEST_FILE = "manifest.json"  # hashes of inputs of generated prompts
 
-    def __init__(self, template_version: int, queries: list[str]):
+    def __init__(
+        self,
+        template_version: int,
+        queries: list[str],
+        num_workers: int = None,
+        is_incremental: bool = False,
+    ):
         self.template_version = template_version
         self.queries = queries
+        self.num_workers = num_workers  # None uses all CPUs
+        self.is_incremental = is_incremental
+        # Parse the template once for all prompts
+        self.template_json = Prompt.load_template(template_version)
+        self.template_hash = hashlib.sha256(
+            json.dumps([template_version, queries, self.template_json], sort_keys=True).encode("utf-8")
+        ).hexdigest()
         # Create path to prompts folder
         prompts_path = Path(
             PromptBuilder.PROMPT_DATASET_PATH, f"v{template_version}", "".join(queries)
         )
         prompts_path.mkdir(parents=True, exist_ok=True)
         self.prompts_path = str(prompts_path)
+        self.manifest_path = os.path.join(self.prompts_path, PromptBuilder.MANIFEST_FILE)
 
     def generate_prompts_for_defects4at(self):
+        bugs = []
         for project_id in PromptBuilder.Defects4AT_PROJECTS:
             project_bugs_path = os.path.join(
                 PromptBuilder.Defects4AT_COMPONENTS_PATH, project_id
@@ -196,17 +305,11 @@ class PromptBuilder:
                     bug_id,
                     "prompt",
                 )
-                for scenario_kind in list(PromptKind):
-                    prompt = Prompt(
-                        project_id,
-                        bug_id,
-                        self.template_version,
-                        scenario_kind,
-                        self.queries,
-                    )
-                    prompt.generate(components_path, self.prompts_path)
+                bugs.append((project_id, bug_id, components_path))
+        self._generate_prompts(bugs, "Defects4AT")
 
     def generate_prompts_for_defects4j(self):
+        bugs = []
         for project_id in os.listdir(PromptBuilder.Defects4J_COMPONENTS_PATH):
             project_path = os.path.join(
                 PromptBuilder.Defects4J_COMPONENTS_PATH, project_id
@@ -218,57 +321,204 @@ class PromptBuilder:
                 if not os.path.isdir(bug_path):
                     continue
                 components_path = os.path.join(bug_path, "prompt")
-                for scenario_kind in list(PromptKind):
-                    prompt = Prompt(
-                        project_id,
-                        bug_id,
-                        self.template_version,
-                        scenario_kind,
-                        self.queries,
+                bugs.append((project_id, bug_id, components_path))
+        self._generate_prompts(bugs, "Defects4J")
+
+    def _generate_prompts(self, bugs: list, dataset: str):
+        """
+        Generates prompts of all scenarios for each bug, fanning bugs out across processes.
+
+        The manifest maps each generated prompt to the template and the hashes of its component files and content.
+        In incremental mode, prompts whose inputs are unchanged since the last generation are skipped.
+
+        Parameters
+        ----------
+        - bugs : list of tuples of project ID, bug ID and path to the prompt components
+        - dataset : str
+        """
+        manifest = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        # Pass only the manifest entries of its prompts to each bug
+        bug_prompt_names = [
+            [
+                Prompt(
+                    project_id,
+                    bug_id,
+                    self.template_version,
+                    scenario_kind,
+                    self.queries,
+                    self.template_json,
+                ).get_prompt_name()
+                for scenario_kind in list(PromptKind)
+            ]
+            for project_id, bug_id, _ in bugs
+        ]
+        bug_manifests = [
+            {name: manifest[name] for name in prompt_names if name in manifest}
+            for prompt_names in bug_prompt_names
+        ]
+        num_written_prompts = 0
+        catalog_rows = []
+        # Catalog prompts generated before, so that the prompts written below are not scanned again
+        prompt_catalog = PromptCatalog()
+        prompt_catalog.ensure_indexed(self.prompts_path)
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+            for prompt_names, (num_written, bug_manifest) in zip(
+                bug_prompt_names,
+                executor.map(
+                    _generate_bug_prompts,
+                    bugs,
+                    bug_manifests,
+                    repeat(self.template_version),
+                    repeat(self.queries),
+                    repeat(self.template_json),
+                    repeat(self.template_hash),
+                    repeat(self.prompts_path),
+                    repeat(self.is_incremental),
+                    chunksize=8,
+                ),
+            ):
+                num_written_prompts += num_written
+                for name in prompt_names:
+                    manifest.pop(name, None)
+                manifest.update(bug_manifest)
+                for name, entry in bug_manifest.items():
+                    catalog_rows.append(
+                        PromptCatalog.create_row(
+                            self.prompts_path,
+                            name,
+                            dataset,
+                            "".join(self.queries),
+                            entry["prompt"],
+                        )
                     )
-                    prompt.generate(components_path, self.prompts_path)
+        with open(self.manifest_path, "w") as f:
+            json.dump(manifest, f, sort_keys=True)
+        # Keep the catalog of generated prompts in sync without scanning the prompts folder
+        prompt_catalog.update_prompts(
+            self.prompts_path,
+            [name for prompt_names in bug_prompt_names for name in prompt_names],
+            catalog_rows,
+        )
+        print(
+            f"Write {num_written_prompts} new or changed prompts of {len(bugs)} bugs from {dataset} to {self.prompts_path}"
+        )
 
 
-def extract_prompt_paths(dataset, chosen_scenario, version, projects, queries) -> list:
+def _generate_bug_prompts(
+    bug: tuple,
+    bug_manifest: dict,
+    template_version: int,
+    queries: list,
+    template_json: dict,
+    template_hash: str,
+    prompts_path: str,
+    is_incremental: bool,
+) -> tuple:
+    """
+    Generates prompts of all scenarios of a bug, run in worker processes.
+
+    Returns
+    -------
+    tuple(int, dict) : the number of written prompt files and the manifest entries of the generated prompts
+    """
+    project_id, bug_id, components_path = bug
+    # component files shared by scenarios are read once
+    components_cache = {}
+    num_written_prompts = 0
+    new_bug_manifest = {}
+    for scenario_kind in list(PromptKind):
+        prompt = Prompt(
+            project_id,
+            bug_id,
+            template_version,
+            scenario_kind,
+            queries,
+            template_json,
+        )
+        prompt_name = prompt.get_prompt_name()
+        previous_entry = bug_manifest.get(prompt_name, {})
+        inputs = prompt.get_input_hashes(
+            components_path, components_cache, previous_entry.get("inputs")
+        )
+        if (
+            is_incremental
+            and inputs is not None
+            and previous_entry.get("template") == template_hash
+            and "prompt" in previous_entry
+            and {name: state[2] for name, state in inputs.items()}
+            == {name: state[2] for name, state in previous_entry["inputs"].items()}
+            and os.path.exists(os.path.join(prompts_path, prompt_name))
+        ):
+            new_bug_manifest[prompt_name] = dict(previous_entry, inputs=inputs)
+            continue
+        if prompt.generate(components_path, prompts_path, components_cache):
+            num_written_prompts += 1
+        if inputs is not None and prompt.prompt_hash is not None:
+            new_bug_manifest[prompt_name] = {
+                "template": template_hash,
+                "inputs": inputs,
+                "prompt": prompt.prompt_hash,
+            }
+    return num_written_prompts, new_bug_manifest
+
+
+def write_if_changed(file_path: str, content: str) -> bool:
+    """
+    Writes the content to the file only if its current content differs.
+
+    Returns
+    -------
+    bool : whether the file was written
+    """
+    content_bytes = content.encode("utf-8")
+    # a file of another size differs without reading it
+    if os.path.exists(file_path) and os.path.getsize(file_path) == len(content_bytes):
+        with open(file_path, "rb") as f:
+            if f.read() == content_bytes:
+                return False
+    with open(file_path, "wb") as f:
+        f.write(content_bytes)
+    return True
+
+
+def extract_prompt_paths(
+    dataset, chosen_scenario, version, projects, queries, rescan=False
+) -> list:
     prompt_paths = []
     prompt_folder_path = os.path.join(
         PROMPT_DATASET_PATH, f"v{version}", "".join(queries)
     )
+    prompt_catalog = PromptCatalog()
     if dataset == "Defects4AT":
-        for prompt_file in os.listdir(prompt_folder_path):
-            # Skip files not matching the pattern
-            matched_prompt = re.search(
-                chosen_scenario.get_prompt_filename_pattern(version),
-                prompt_file,
-            )
-            if not matched_prompt:
-                continue
-            project_id = matched_prompt.group(1)
-            if project_id in projects:
-                prompt_paths.append(os.path.join(prompt_folder_path, prompt_file))
+        prompt_paths = prompt_catalog.select(
+            prompt_folder_path,
+            chosen_scenario,
+            version,
+            projects=projects,
+            rescan=rescan,
+        )
     elif dataset == "Defects4J":
-        for prompt_file in os.listdir(prompt_folder_path):
-            # Skip files not matching the pattern
-            matched_prompt = re.search(
-                chosen_scenario.get_prompt_filename_pattern(version),
-                prompt_file,
-            )
-            if not matched_prompt:
-                continue
-            project_id = matched_prompt.group(1)
-            if project_id not in projects:
-                prompt_paths.append(os.path.join(prompt_folder_path, prompt_file))
+        prompt_paths = prompt_catalog.select(
+            prompt_folder_path,
+            chosen_scenario,
+            version,
+            excluded_projects=projects,
+            rescan=rescan,
+        )
     elif dataset == "Validation":
         with open(FINE_TUNE_LLM_VALIDATION_PATH) as f:
             validation_paths = json.load(f)
 
         # Filter paths by the specified scenario
-        for validation_path in validation_paths:
-            prompt_path = os.path.join(
-                prompt_folder_path, os.path.basename(validation_path)
-            )
-            if chosen_scenario.name.lower() in prompt_path:
-                prompt_paths.append(prompt_path)
+        prompt_paths = prompt_catalog.select(
+            prompt_folder_path,
+            chosen_scenario,
+            names=[os.path.basename(p) for p in validation_paths],
+            rescan=rescan,
+        )
     return prompt_paths
 
 
@@ -285,40 +535,15 @@ def search_prompts_from_defects4at(prompt_kind: PromptKind, projects, version):
     Returns:
     - list: A list of prompt files.
     """
-    # List to hold all matching file paths
-    matching_files = []
-    # Regex pattern to match files like "prompt_abc.txt"
-    pattern = prompt_kind.get_prompt_filename_pattern(version)
-
     # Search prompts only in the project
-    for project in projects:
-        directory = os.path.join(BUGS_PATH, project)
-        # Walk through the directory
-        for root, _, files in os.walk(directory):
-            for file in files:
-                # Check if file matches the pattern
-                if pattern.match(file):
-                    # Add the full path of the file to the list
-                    full_path = os.path.join(root, file)
-                    matching_files.append(full_path)
-    return matching_files
+    return PromptCatalog().select(BUGS_PATH, prompt_kind, version, projects=projects)
 
 
 def search_prompts_from_defects4j(prompt_kind: PromptKind, version):
     """
     Search prompts from Defects4J dataset.
     """
-    matching_files = []
-    pattern = prompt_kind.get_prompt_filename_pattern(version)
-    # Walk through the directory
-    for root, _, files in os.walk(DEFACTS4J_PROMPT_PATH):
-        for file in files:
-            # Check if file matches the pattern
-            if pattern.match(file):
-                # Add the full path of the file to the list
-                full_path = os.path.join(root, file)
-                matching_files.append(full_path)
-    return matching_files
+    return PromptCatalog().select(DEFACTS4J_PROMPT_PATH, prompt_kind, version)
 
 
 def extract_filename(path):
@@ -0,0 +1,228 @@
+"""
+File to catalog prompt files so that prompts are selected with indexed queries instead of directory scans.
+"""
+
+import os
+import re
+import sqlite3
+
+from src import PROMPT_CATALOG_PATH, TOKEN_INDEX_PATH
+from src.prompt.prompt_kind import PromptKind
+from src.prompt.token_index import TokenIndex
+
+PROMPT_FILENAME_PATTERN = re.compile(
+    r"^prompt_(buggy|fixed|similar)_(\d+)_([-A-Za-z]+)_v(\d+)\.txt$"
+)
+
+
+class PromptCatalog:
+    """
+    SQLite catalog of prompt files with their project, bug, scenario, version, query set and content hash.
+
+    Prompts are grouped by the root folder they are stored in, e.g., PromptDataset/v4/Q1Q2Q3Q4Q5.
+    PromptBuilder keeps the catalog of the folder it writes to up to date. Any other root folder
+    is scanned once when it is first queried, and scanned again when selecting with rescan=True,
+    e.g., after its prompt files were changed outside PromptBuilder.
+    Token counts are joined from the token index by content hash.
+    """
+
+    def __init__(self, path: str = PROMPT_CATALOG_PATH, token_index_path: str = TOKEN_INDEX_PATH):
+        self.path = path
+        self.token_index_path = token_index_path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS prompts ("
+                "path TEXT PRIMARY KEY, root TEXT, name TEXT, dataset TEXT, project TEXT, bug TEXT, "
+                "scenario TEXT, version TEXT, query_set TEXT, text_hash TEXT)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS prompts_selection "
+                "ON prompts (root, scenario, version, project)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS prompts_name ON prompts (root, name)"
+            )
+
+    @staticmethod
+    def create_row(
+        root: str, name: str, dataset: str = None, query_set: str = None, text_hash: str = None
+    ) -> tuple | None:
+        """
+        Creates a catalog row of a prompt file from its name, or None if the name is not a prompt name.
+        """
+        matched_prompt = PROMPT_FILENAME_PATTERN.match(name)
+        if not matched_prompt:
+            return None
+        scenario, bug, project, version = matched_prompt.groups()
+        return (
+            os.path.join(root, name),
+            root,
+            name,
+            dataset,
+            project,
+            bug,
+            scenario.upper(),
+            version,
+            query_set,
+            text_hash,
+        )
+
+    def update_prompts(self, root: str, removed_names: list, rows: list):
+        """
+        Removes prompts of a root folder by name and inserts or replaces prompt rows created by create_row.
+        """
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM prompts WHERE root = ? AND name = ?",
+                [(root, name) for name in removed_names],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO prompts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def index_folder(self, root: str, dataset: str = None, query_set: str = None):
+        """
+        Catalogs all prompt files under a root folder, replacing its previous catalog.
+        """
+        print(f"Index prompts in {root} ...")
+        rows = []
+        for folder, _, files in os.walk(root):
+            for file in files:
+                row = PromptCatalog.create_row(folder, file, dataset, query_set)
+                if row is not None:
+                    # prompts in sub-folders are grouped by the root folder
+                    rows.append(row[:1] + (root,) + row[2:])
+        with self.connection:
+            self.connection.execute("DELETE FROM prompts WHERE root = ?", (root,))
+            self.connection.executemany(
+                "INSERT INTO prompts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def ensure_indexed(self, root: str):
+        """
+        Scans the root folder if none of its prompts is cataloged.
+        """
+        row = self.connection.execute(
+            "SELECT 1 FROM prompts WHERE root = ? LIMIT 1", (root,)
+        ).fetchone()
+        if row is None:
+            self.index_folder(root)
+
+    def select(
+        self,
+        root: str,
+        scenario: PromptKind = None,
+        version=None,
+        projects: list = None,
+        excluded_projects: list = None,
+        names: list = None,
+        max_tokens: int = None,
+        tokenizer_id: str = None,
+        rescan: bool = False,
+    ) -> list:
+        """
+        Selects paths to prompts in a root folder matching all given filters.
+
+        Parameters
+        ----------
+        - root : str
+            the folder storing the prompts
+        - scenario : PromptKind
+        - version : the version of prompting template
+        - projects : list of projects to include
+        - excluded_projects : list of projects to exclude
+        - names : list of prompt file names to include, the order of which is kept in the result
+        - max_tokens : int
+            the maximum number of tokens of a prompt counted by the tokenizer with the ID tokenizer_id
+        - rescan : bool
+            whether to scan the root folder again before selecting, replacing its catalog
+
+        Returns
+        -------
+        list : paths to the selected prompts
+        """
+        if rescan:
+            self.index_folder(root)
+        else:
+            self.ensure_indexed(root)
+        conditions = ["root = ?"]
+        parameters = [root]
+        if scenario is not None:
+            conditions.append("scenario = ?")
+            parameters.append(scenario.name)
+        if version is not None:
+            conditions.append("version = ?")
+            parameters.append(str(version))
+        for column, values, operator in [
+            ("project", projects, "IN"),
+            ("project", excluded_projects, "NOT IN"),
+            ("name", names, "IN"),
+        ]:
+            if values is not None:
+                conditions.append(f"{column} {operator} ({', '.join('?' * len(values))})")
+                parameters += list(values)
+        where_clause = " AND ".join(conditions)
+        if max_tokens is None:
+            paths = [
+                path
+                for (path,) in self.connection.execute(
+                    f"SELECT path FROM prompts WHERE {where_clause} ORDER BY path",
+                    parameters,
+                )
+            ]
+        else:
+            paths = self._select_by_tokens(where_clause, parameters, max_tokens, tokenizer_id)
+        if names is not None:
+            name_order = {name: i for i, name in enumerate(names)}
+            paths.sort(key=lambda path: name_order[os.path.basename(path)])
+        return paths
+
+    def _select_by_tokens(
+        self, where_clause: str, parameters: list, max_tokens: int, tokenizer_id: str
+    ) -> list:
+        # Hash contents of prompts cataloged from a scan
+        unhashed_paths = [
+            path
+            for (path,) in self.connection.execute(
+                f"SELECT path FROM prompts WHERE {where_clause} AND text_hash IS NULL",
+                parameters,
+            )
+        ]
+        if unhashed_paths:
+            rows = []
+            for path in unhashed_paths:
+                with open(path, "r", encoding="utf-8") as f:
+                    rows.append((TokenIndex.hash_text(f.read()), path))
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE prompts SET text_hash = ? WHERE path = ?", rows
+                )
+        # Count tokens of prompts missing in the token index and join token counts
+        token_index = TokenIndex(self.token_index_path)
+        self.connection.execute("ATTACH DATABASE ? AS token_index", (self.token_index_path,))
+        try:
+            join_clause = (
+                "FROM prompts LEFT JOIN token_index.token_counts AS t "
+                "ON prompts.text_hash = t.text_hash AND t.tokenizer_id = ?"
+            )
+            uncounted_paths = [
+                path
+                for (path,) in self.connection.execute(
+                    f"SELECT path {join_clause} WHERE {where_clause} AND t.num_tokens IS NULL",
+                    [tokenizer_id] + parameters,
+                )
+            ]
+            if uncounted_paths:
+                token_index.count_file_tokens(tokenizer_id, uncounted_paths)
+            return [
+                path
+                for (path,) in self.connection.execute(
+                    f"SELECT path {join_clause} WHERE {where_clause} AND t.num_tokens <= ? ORDER BY path",
+                    [tokenizer_id] + parameters + [max_tokens],
+                )
+            ]
+        finally:
+            self.connection.execute("DETACH DATABASE token_index")
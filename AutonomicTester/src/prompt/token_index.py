@@ -0,0 +1,126 @@
+"""
+File to index token counts of prompts so that they are tokenized only once per tokenizer.
+"""
+
+import hashlib
+import os
+import sqlite3
+
+from src import TOKEN_INDEX_PATH
+
+TOKENIZE_BATCH_SIZE = 64
+# text hashes looked up per query, below the limit of 999 parameters of older SQLite versions
+LOOKUP_BATCH_SIZE = 900
+
+
+class TokenIndex:
+    """
+    SQLite index of token counts keyed by the SHA-256 hash of a text (e.g., the content of a prompt file) and a tokenizer ID.
+
+    A tokenizer ID is either huggingface/<model name> or tiktoken/<encoding name>.
+    The tokenizer is only loaded when some texts are missing in the index.
+    """
+
+    def __init__(self, path: str = TOKEN_INDEX_PATH):
+        self.path = path
+        self.batch_encode = {}  # loaded batch encoders by tokenizer ID
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS token_counts ("
+                "text_hash TEXT, tokenizer_id TEXT, num_tokens INTEGER, "
+                "PRIMARY KEY (text_hash, tokenizer_id))"
+            )
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def count_file_tokens(self, tokenizer_id: str, file_paths: list) -> dict:
+        """
+        Returns a dictionary mapping each file path to the number of tokens of its content.
+        """
+        texts = []
+        for file_path in file_paths:
+            with open(file_path, "r", encoding="utf-8") as f:
+                texts.append(f.read())
+        return dict(zip(file_paths, self.count_tokens(tokenizer_id, texts)))
+
+    def count_tokens(self, tokenizer_id: str, texts: list) -> list:
+        """
+        Returns the number of tokens of each text, tokenizing only texts missing in the index in batches.
+        """
+        text_hashes = [TokenIndex.hash_text(text) for text in texts]
+        num_tokens = self._lookup(tokenizer_id, set(text_hashes))
+        missing_texts = {}
+        for text_hash, text in zip(text_hashes, texts):
+            if text_hash not in num_tokens:
+                missing_texts[text_hash] = text
+        if missing_texts:
+            print(
+                f"Tokenize {len(missing_texts)} texts missing in the token index with {tokenizer_id} ..."
+            )
+            batch_encode = self._get_batch_encode(tokenizer_id)
+            missing_hashes = list(missing_texts)
+            rows = []
+            for start in range(0, len(missing_hashes), TOKENIZE_BATCH_SIZE):
+                batch_hashes = missing_hashes[start : start + TOKENIZE_BATCH_SIZE]
+                batch_counts = batch_encode([missing_texts[h] for h in batch_hashes])
+                for text_hash, count in zip(batch_hashes, batch_counts):
+                    num_tokens[text_hash] = count
+                    rows.append((text_hash, tokenizer_id, count))
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO token_counts VALUES (?, ?, ?)", rows
+                )
+        return [num_tokens[text_hash] for text_hash in text_hashes]
+
+    def _lookup(self, tokenizer_id: str, text_hashes: set) -> dict:
+        """
+        Looks up the indexed token counts of the texts in batches through the primary key.
+        """
+        text_hashes = list(text_hashes)
+        num_tokens = {}
+        for start in range(0, len(text_hashes), LOOKUP_BATCH_SIZE):
+            batch_hashes = text_hashes[start : start + LOOKUP_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch_hashes))
+            rows = self.connection.execute(
+                "SELECT text_hash, num_tokens FROM token_counts "
+                f"WHERE tokenizer_id = ? AND text_hash IN ({placeholders})",
+                [tokenizer_id] + batch_hashes,
+            )
+            num_tokens.update(rows)
+        return num_tokens
+
+    def _get_batch_encode(self, tokenizer_id: str):
+        """
+        Loads a function that counts the tokens of each text in a batch.
+        """
+        if tokenizer_id in self.batch_encode:
+            return self.batch_encode[tokenizer_id]
+        library, name = tokenizer_id.split("/", 1)
+        if library == "huggingface":
+            import huggingface_hub
+            from transformers import AutoTokenizer
+
+            if not os.path.exists(name):
+                huggingface_hub.login(os.environ["HUGGING_FACE_API_KEY"])
+            # the fast tokenizer encodes a batch of texts in parallel
+            tokenizer = AutoTokenizer.from_pretrained(name, use_fast=True)
+
+            def batch_encode(texts):
+                encodings = tokenizer(texts, add_special_tokens=False)["input_ids"]
+                return [len(input_ids) for input_ids in encodings]
+
+        elif library == "tiktoken":
+            import tiktoken
+
+            encoding = tiktoken.get_encoding(name)
+
+            def batch_encode(texts):
+                return [len(tokens) for tokens in encoding.encode_batch(texts)]
+
+        else:
+            raise ValueError(f"Tokenizer {tokenizer_id} not supported!")
+        self.batch_encode[tokenizer_id] = batch_encode
+        return batch_encode
@@ -1,24 +1,80 @@
+import asyncio
 import json
+from contextvars import ContextVar
+from typing import ClassVar
+from llama_index.core.base.embeddings.base import BaseEmbedding, mean_agg
+from llama_index.core.base.response.schema import Response
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.callbacks import TokenCountingHandler
 from llama_index.core.query_engine import CustomQueryEngine
+from llama_index.core.schema import QueryBundle
 from llama_index.core.retrievers import BaseRetriever
 from llama_index.core.llms import LLM
 from llama_index.core import PromptTemplate
 
+from src.llm.response_cache import ResponseCache
+
+# token counts of the query running in the current context, e.g., an asyncio task
+current_query_token_counts: ContextVar = ContextVar("current_query_token_counts", default=None)
+
+
+class QueryTokenCountingHandler(TokenCountingHandler):
+    """
+    Counts LLM tokens like TokenCountingHandler and adds them to the counts of the query running in the current context,
+    so that tokens of concurrent queries are accounted separately.
+    """
+
+    def on_event_end(self, event_type, payload=None, event_id: str = "", **kwargs):
+        num_counted_events = len(self.llm_token_counts)
+        super().on_event_end(event_type, payload=payload, event_id=event_id, **kwargs)
+        query_token_counts = current_query_token_counts.get()
+        if query_token_counts is None:
+            return
+        for token_count in self.llm_token_counts[num_counted_events:]:
+            query_token_counts["total_llm_token_count"] += token_count.total_token_count
+            query_token_counts["prompt_llm_token_count"] += token_count.prompt_token_count
+
 
 class EtestQueryEngine(CustomQueryEngine):
-    """E-Test Query Engine."""
+    """
+    E-Test Query Engine.
+
+    Details of the prompt sent to the LLM are returned in the metadata of the response,
+    so that the engine can run several queries concurrently.
+
+    Asynchronous queries retrieve nodes for the embedding strings of the query, which a query bundle can set
+    to a context shared by several questions (e.g., the monitored scenario and test suite). Nodes are retrieved
+    once per distinct embedding strings, and each distinct string is embedded once with embed_model.
+    """
+
+    # options of LLM clients that do not influence completions, which are not part of cached requests
+    CONNECTION_OPTIONS: ClassVar[set] = {
+        "api_key",
+        "api_base",
+        "api_version",
+        "base_url",
+        "default_headers",
+        "headers",
+        "keep_alive",
+        "max_retries",
+        "request_timeout",
+        "reuse_client",
+        "timeout",
+    }
 
     retriever: BaseRetriever
     llm: LLM
     qa_prompt: PromptTemplate
-    prompt_dict: dict = None
-
-    def custom_query(self, query_str: str):
-        nodes = self.retriever.retrieve(query_str)
+    response_cache: ResponseCache | None = None
+    embed_model: BaseEmbedding | None = None  # the embedding model of the indexed nodes
+    # retrievals and embeddings by their strings, shared by concurrent queries while running
+    _retrievals: dict = PrivateAttr(default_factory=dict)
+    _embeddings: dict = PrivateAttr(default_factory=dict)
 
+    def _create_prompt(self, query_str: str, nodes: list) -> tuple:
         context_str = "\n\n".join([n.node.get_content() for n in nodes])
         prompt = self.qa_prompt.format(context_str=context_str, query_str=query_str)
-        self.prompt_dict = {
+        prompt_dict = {
             "num_total_chars": len(prompt),
             "num_context_chars": len(context_str),
             "num_query_chars": len(query_str),
@@ -26,5 +82,85 @@ class EtestQueryEngine(CustomQueryEngine):
             "context_str": context_str,
             "query_str": query_str,
         }
-        response = self.llm.complete(prompt)
-        return str(response)
+        return prompt, prompt_dict
+
+    def _create_request(self, prompt: str) -> dict:
+        """
+        Creates the request of a completion to cache, with the LLM class, all its completion options
+        (e.g., model, temperature, context window and additional kwargs such as the seed) and the prompt.
+        """
+        llm_options = {
+            name: value
+            for name, value in self.llm.to_dict().items()
+            if name not in EtestQueryEngine.CONNECTION_OPTIONS
+        }
+        return {
+            "llm": llm_options,
+            "metadata": self.llm.metadata.model_dump(),
+            "prompt": prompt,
+        }
+
+    def custom_query(self, query_str: str):
+        nodes = self.retriever.retrieve(query_str)
+        prompt, prompt_dict = self._create_prompt(query_str, nodes)
+        if self.response_cache is None:
+            return Response(str(self.llm.complete(prompt)), metadata=prompt_dict)
+        response, is_hit = self.response_cache.get_or_compute(
+            self._create_request(prompt), lambda: str(self.llm.complete(prompt))
+        )
+        prompt_dict["cache_hit"] = is_hit
+        return Response(response, metadata=prompt_dict)
+
+    async def aquery(self, str_or_query_bundle) -> Response:
+        """
+        Runs a query asynchronously, retrieving nodes for the embedding strings of a query bundle if given.
+        """
+        if isinstance(str_or_query_bundle, str):
+            str_or_query_bundle = QueryBundle(str_or_query_bundle)
+        with self.callback_manager.as_trace("query"):
+            return await self._aquery_bundle(str_or_query_bundle)
+
+    async def acustom_query(self, query_str: str):
+        return await self._aquery_bundle(QueryBundle(query_str))
+
+    async def _aquery_bundle(self, query_bundle: QueryBundle) -> Response:
+        query_str = query_bundle.query_str
+        nodes = await self._aretrieve(query_bundle.embedding_strs)
+        prompt, prompt_dict = self._create_prompt(query_str, nodes)
+
+        async def acomplete():
+            return str(await self.llm.acomplete(prompt))
+
+        if self.response_cache is None:
+            return Response(await acomplete(), metadata=prompt_dict)
+        response, is_hit = await self.response_cache.aget_or_compute(
+            self._create_request(prompt), acomplete
+        )
+        prompt_dict["cache_hit"] = is_hit
+        return Response(response, metadata=prompt_dict)
+
+    async def _aretrieve(self, embedding_strs: list) -> list:
+        """
+        Retrieves nodes for the embedding strings, sharing the retrieval with other queries of the same strings.
+        """
+        key = tuple(embedding_strs)
+        if key not in self._retrievals:
+            self._retrievals[key] = asyncio.ensure_future(self._aretrieve_nodes(embedding_strs))
+        return await self._retrievals[key]
+
+    async def _aretrieve_nodes(self, embedding_strs: list) -> list:
+        query_bundle = QueryBundle(" ".join(embedding_strs), custom_embedding_strs=embedding_strs)
+        if self.embed_model is not None and embedding_strs:
+            embeddings = [await self._aembed(embedding_str) for embedding_str in embedding_strs]
+            query_bundle.embedding = mean_agg(embeddings) if len(embeddings) > 1 else embeddings[0]
+        return await self.retriever.aretrieve(query_bundle)
+
+    async def _aembed(self, embedding_str: str) -> list:
+        """
+        Embeds a query string once, sharing its embedding with other retrievals.
+        """
+        if embedding_str not in self._embeddings:
+            self._embeddings[embedding_str] = asyncio.ensure_future(
+                self.embed_model.aget_query_embedding(embedding_str)
+            )
+        return await self._embeddings[embedding_str]
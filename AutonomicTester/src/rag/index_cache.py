@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import re
+from collections import defaultdict
+from llama_index.core import Settings, StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import MetadataMode
+
+from src import RAG_INDEX_CACHE_PATH
+from src.rag.index_format import IndexFormat
+
+
+class IndexCache:
+    """
+    Persists vector indexes of Defects4J checkouts on disk and reloads them while the indexed files are unchanged.
+
+    A new index reuses the embedded nodes of files unchanged in the persisted index of the other version
+    of the same bug (e.g., 1f reuses 1b), so only changed files are chunked and embedded again.
+    """
+
+    FINGERPRINT_FILE = "fingerprint.json"
+    DOCUMENTS_FILE = "documents.json"  # hash of the embedded content of each indexed file
+
+    def __init__(self, cache_path: str = RAG_INDEX_CACHE_PATH):
+        self.cache_path = cache_path
+
+    def get_index_path(self, project: str, version_name: str, index_format: IndexFormat) -> str:
+        """
+        Returns the folder storing the index of a project version (e.g., 1b) built with the current embedding model.
+        """
+        embed_model_name = re.sub(r"[^-.\w]", "_", Settings.embed_model.model_name)
+        return os.path.join(
+            self.cache_path,
+            project,
+            f"{version_name}_{index_format.value}_{embed_model_name}",
+        )
+
+    @staticmethod
+    def hash_document(document) -> str:
+        """
+        Hashes the content of a document together with the metadata included in its embeddings.
+        """
+        return hashlib.sha256(
+            document.get_content(metadata_mode=MetadataMode.EMBED).encode("utf-8")
+        ).hexdigest()
+
+    @staticmethod
+    def fingerprint(documents: list) -> str:
+        """
+        Hashes the paths and embedded contents of all indexed documents.
+        """
+        sha = hashlib.sha256()
+        for document in sorted(documents, key=lambda d: d.metadata.get("file_path", "")):
+            sha.update(document.metadata.get("file_path", "").encode("utf-8"))
+            sha.update(IndexCache.hash_document(document).encode("utf-8"))
+        return sha.hexdigest()
+
+    def load_or_build(
+        self, project: str, exp_path: str, index_format: IndexFormat, documents: list
+    ) -> tuple:
+        """
+        Loads the persisted index if its fingerprint matches the documents, otherwise builds and persists a new index.
+
+        Returns
+        -------
+        tuple(VectorStoreIndex, bool) : the index and whether it was loaded from the cache
+        """
+        version_name = os.path.basename(exp_path)
+        index_path = self.get_index_path(project, version_name, index_format)
+        fingerprint_path = os.path.join(index_path, IndexCache.FINGERPRINT_FILE)
+        fingerprint = IndexCache.fingerprint(documents)
+        if os.path.exists(fingerprint_path):
+            with open(fingerprint_path) as f:
+                if json.load(f)["fingerprint"] == fingerprint:
+                    storage_context = StorageContext.from_defaults(persist_dir=index_path)
+                    return load_index_from_storage(storage_context), True
+        # Identify documents by their paths in the checkout to match files across versions
+        document_hashes = {}
+        for document in documents:
+            document.id_ = os.path.relpath(document.metadata["file_path"], exp_path)
+            document_hashes[document.id_] = IndexCache.hash_document(document)
+        sibling_index_path = self.get_index_path(
+            project, IndexCache._get_sibling_version_name(version_name), index_format
+        )
+        index = IndexCache._build_index(documents, document_hashes, sibling_index_path)
+        index.storage_context.persist(persist_dir=index_path)
+        with open(os.path.join(index_path, IndexCache.DOCUMENTS_FILE), "w") as f:
+            json.dump(document_hashes, f, indent=4)
+        with open(fingerprint_path, "w") as f:
+            json.dump({"fingerprint": fingerprint}, f, indent=4)
+        return index, False
+
+    @staticmethod
+    def _get_sibling_version_name(version_name: str) -> str:
+        # version name ends with either character b or f.
+        sibling_version_map = {"b": "f", "f": "b"}
+        return version_name[:-1] + sibling_version_map[version_name[-1]]
+
+    @staticmethod
+    def _build_index(documents: list, document_hashes: dict, sibling_index_path: str):
+        """
+        Builds an index embedding only documents that are missing or changed in the sibling index.
+        """
+        sibling_documents_path = os.path.join(sibling_index_path, IndexCache.DOCUMENTS_FILE)
+        if not os.path.exists(sibling_documents_path):
+            return VectorStoreIndex.from_documents(documents)
+        with open(sibling_documents_path) as f:
+            sibling_document_hashes = json.load(f)
+        sibling_storage_context = StorageContext.from_defaults(persist_dir=sibling_index_path)
+        sibling_nodes = defaultdict(list)
+        for node in sibling_storage_context.docstore.docs.values():
+            sibling_nodes[node.ref_doc_id].append(node)
+
+        reused_nodes = []
+        changed_documents = []
+        for document in documents:
+            if (
+                sibling_document_hashes.get(document.id_) != document_hashes[document.id_]
+                or document.id_ not in sibling_nodes
+            ):
+                changed_documents.append(document)
+                continue
+            for sibling_node in sibling_nodes[document.id_]:
+                node = sibling_node.model_copy()
+                node.metadata = dict(document.metadata)
+                node.embedding = sibling_storage_context.vector_store.get(node.node_id)
+                reused_nodes.append(node)
+        print(
+            f"Reuse embeddings of {len(documents) - len(changed_documents)} unchanged files from {sibling_index_path}, embedding {len(changed_documents)} changed files ..."
+        )
+        # Nodes with embeddings are not embedded again
+        changed_nodes = run_transformations(changed_documents, Settings.transformations)
+        return VectorStoreIndex(reused_nodes + changed_nodes)
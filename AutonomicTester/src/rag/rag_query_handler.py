@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import json
 import os
@@ -7,14 +9,27 @@ import javalang
 import re
 import pandas as pd
 from javalang.tree import MethodDeclaration
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, PromptTemplate
-from llama_index.core.callbacks import CallbackManager, TokenCountingHandler
+from llama_index.core import SimpleDirectoryReader, Settings, VectorStoreIndex, PromptTemplate
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.schema import QueryBundle
 import tiktoken
 from transformers import AutoTokenizer
 from src import DEFACTS4J_PATH, PROMPT_TEMPLATE_PATH
 from src.output.output import create_experiment_folder, write_arguments
-from src.rag.etest_query_engine import EtestQueryEngine
-from src.utils.defects4j_util import get_src_class_path, get_src_tests_path
+from src.output.results_sink import ResultsSink
+from src.rag.etest_query_engine import (
+    EtestQueryEngine,
+    QueryTokenCountingHandler,
+    current_query_token_counts,
+)
+from src.rag.index_cache import IndexCache
+from src.llm.response_cache import ResponseCache
+from src.prompt.token_index import TokenIndex
+from src.utils.defects4j_util import (
+    get_src_class_path,
+    get_src_tests_path,
+    prefetch_metadata,
+)
 from src.prompt.prompt_kind import PromptKind
 from src.rag.index_format import IndexFormat
 from src.llm.llm_kind import LLMKind
@@ -22,6 +37,18 @@ from llama_index.llms.openai import OpenAI
 from llama_index.llms.ollama import Ollama
 
 
+def _count_test_cases(test_suite: str) -> int:
+    """
+    Counts test methods in the source code of a test suite, run in worker processes.
+    """
+    tree = javalang.parse.parse(test_suite)
+    return sum(
+        1
+        for _, node in tree.filter(MethodDeclaration)
+        if "test" in node.name.lower() or "@Test" in node.annotations
+    )
+
+
 class RagQueryHandler:
     Defects4J_PROMPT_DATASET_PATH = os.path.join(DEFACTS4J_PATH, "dataset")
     Defects4J_DATASET_PATH = os.path.join(
@@ -29,6 +56,8 @@ class RagQueryHandler:
     )  # preprocessed Defects4J dataset without trigger tests
     COMPONENTS_FILE = "components.jsonl"
     PROGRESS_FILE = "progress.jsonl"
+    # the checkout path differs between buggy and fixed versions and between machines
+    EXCLUDED_EMBED_METADATA_KEYS = ["file_path"]
     SUMMARY_FILE = "summary.jsonl"
     FILTERED_SCENARIOS_FILE = "filtered_scenarios.csv"
 
@@ -39,8 +68,16 @@ class RagQueryHandler:
         self.dataset = args.dataset
         self.queries = args.queries
         self.temperature = float(args.temperature)
+        self.num_workers = args.workers
+        self.is_shared_retrieval = args.shared_retrieval == "on"
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.index_format = IndexFormat[args.index_format]
+        self.response_cache = None
+        if args.cache == "on":
+            self.response_cache = ResponseCache(float(args.cache_size))
+        self.index_cache = None
+        if args.index_cache == "on":
+            self.index_cache = IndexCache()
         self.results_path = create_experiment_folder(
             self.chosen_llm,
             self.chosen_scenario,
@@ -57,16 +94,15 @@ class RagQueryHandler:
             args,
             self.chosen_llm.get_intenal_model_name(),
         )
+        self.results_sink = ResultsSink()
         self._get_llm_caller()
         self._read_qa_template()
-        self.total_llm_token_count = 0
-        self.prompt_llm_token_count = 0
 
     def _get_llm_caller(self):
         if self.chosen_llm.is_gpt_model():
             llm_name = self.chosen_llm.get_intenal_model_name()
             # Set up OpenAI token counter call back
-            self.token_counter = TokenCountingHandler(
+            self.token_counter = QueryTokenCountingHandler(
                 tokenizer=tiktoken.encoding_for_model(llm_name).encode
             )
             callback_manager = CallbackManager([self.token_counter])
@@ -81,7 +117,7 @@ class RagQueryHandler:
             llama3_tokenizer = AutoTokenizer.from_pretrained(
                 self.chosen_llm.get_hf_model_name()
             )
-            self.token_counter = TokenCountingHandler(
+            self.token_counter = QueryTokenCountingHandler(
                 tokenizer=llama3_tokenizer.tokenize
             )
             callback_manager = CallbackManager([self.token_counter])
@@ -142,9 +178,9 @@ class RagQueryHandler:
 
         return experiments
 
-    def _build_query_engine(self, exp_path: str):
+    def _build_query_engine(self, project: str, exp_path: str):
         """
-        Builds QueryEngine object from indexes.
+        Builds QueryEngine object from indexes, reusing the persisted index if the index cache is enabled.
         """
         print(
             f"Building RAG query engine with indexing of all .java files in folder {exp_path} ..."
@@ -162,22 +198,35 @@ class RagQueryHandler:
                 required_exts=[".java"],
             ).load_data()
             documents = src_class_docs + src_tests_docs
+            for document in documents:
+                document.excluded_embed_metadata_keys += [
+                    key
+                    for key in RagQueryHandler.EXCLUDED_EMBED_METADATA_KEYS
+                    if key not in document.excluded_embed_metadata_keys
+                ]
         elif self.index_format is IndexFormat.JSON:
             # TODO
             pass
 
         # Measure indexing time
         index_time_start = time.time_ns()
-        index = VectorStoreIndex.from_documents(documents)
+        if self.index_cache is not None:
+            index, is_cached = self.index_cache.load_or_build(
+                project, exp_path, self.index_format, documents
+            )
+        else:
+            index, is_cached = VectorStoreIndex.from_documents(documents), False
         elapsed_nanoseconds = time.time_ns() - index_time_start
         retriever = index.as_retriever()
         query_engine = EtestQueryEngine(
             retriever=retriever,
             llm=self.llm_caller,
             qa_prompt=PromptTemplate(self.qa_template["template"]),
+            response_cache=self.response_cache,
+            embed_model=Settings.embed_model,
         )
 
-        return query_engine, elapsed_nanoseconds
+        return query_engine, elapsed_nanoseconds, is_cached
 
     def _read_project_components(self, exp_path: str, project: str, bug: str) -> list:
         """
@@ -233,6 +282,9 @@ class RagQueryHandler:
     def analyze_test_suites(self):
         """
         Count the number of test cases, characters, tokens in test suites of buggy classes.
+
+        Each distinct test suite is parsed once in a process pool and tokenized once in batches,
+        reading token counts from the token index if the test suite was already tokenized.
         """
         test_suite_stats_path = os.path.join(
             RagQueryHandler.Defects4J_DATASET_PATH,
@@ -240,81 +292,114 @@ class RagQueryHandler:
         )
         if os.path.exists(test_suite_stats_path):
             return
-        huggingface_hub.login(os.environ["HUGGING_FACE_API_KEY"])
         experiments = self._extract_experiments()
         num_exps = len(experiments)
-        # Iterate over Java projects
+        prefetch_metadata(defects4j_project_paths=[exp["path"] for exp in experiments])
+        # Collect scenarios of all Java projects with paths to their test suites
+        all_test_suite_stats = []
+        test_suite_paths = []
         for i, exp in enumerate(experiments):
             project = exp["project"]
             bug = exp["bug"]
             exp_path = exp["path"]
-            print(f"[{i + 1}/{num_exps}] - Processing project {project} bug {bug} ...")
+            print(f"[{i + 1}/{num_exps}] - Collecting test suites of project {project} bug {bug} ...")
             components_list = self._read_project_components(
                 exp_path.replace(f"{bug}f", f"{bug}b"), project, bug
             )
-            num_scenarios = len(components_list)
-            prev_test_suite_name = ""
-            # Iterate over scenarios
             for index, components in enumerate(components_list):
-                print(f"\t[{index+1}/{num_scenarios}] Checking scenario ...")
                 test_suite_name = components["test_suite"]
-                # Reuse processed test suite
-                if test_suite_name != prev_test_suite_name:
-                    test_suite_path = os.path.join(
-                        get_src_tests_path(exp_path),
-                        test_suite_name.replace(".", "/") + ".java",
-                    )
-                    with open(test_suite_path) as f_test_suite:
-                        test_suite = f_test_suite.read()
-                    tree = javalang.parse.parse(test_suite)
-                    test_case_count = sum(
-                        1
-                        for _, node in tree.filter(MethodDeclaration)
-                        if "test" in node.name.lower() or "@Test" in node.annotations
-                    )
-                    num_chars = len(test_suite)
-                    llama3_tokenizer = AutoTokenizer.from_pretrained("meta-llama/Meta-Llama-3-8B")
-                    gpt_tokenizer = tiktoken.get_encoding("cl100k_base")
-                    num_gpt_tokens = len(gpt_tokenizer.encode(test_suite))
-                    num_llama_tokens = len(llama3_tokenizer.tokenize(test_suite))
-                prev_test_suite_name = test_suite_name
-                test_suite_stats = {
-                    "project": project,
-                    "bug": bug,
-                    "scenario_index": index,
-                    "buggy_class": components["buggy_class"],
-                    "buggy_method": components["buggy_method"],
-                    "test_suite_name": test_suite_name,
-                    "test_case_count": test_case_count,
-                    "num_chars": num_chars,
-                    "num_gpt_tokens": num_gpt_tokens,
-                    "num_llama_tokens": num_llama_tokens,
-                }
-                with open(
-                    test_suite_stats_path,
-                    "a",
-                ) as f:
-                    f.write(json.dumps(test_suite_stats) + "\n")
+                test_suite_path = os.path.join(
+                    get_src_tests_path(exp_path),
+                    test_suite_name.replace(".", "/") + ".java",
+                )
+                test_suite_paths.append(test_suite_path)
+                all_test_suite_stats.append(
+                    {
+                        "project": project,
+                        "bug": bug,
+                        "scenario_index": index,
+                        "buggy_class": components["buggy_class"],
+                        "buggy_method": components["buggy_method"],
+                        "test_suite_name": test_suite_name,
+                    }
+                )
+        # Deduplicate test suites by path and then by content shared across bugs
+        test_suites = {}
+        for test_suite_path in dict.fromkeys(test_suite_paths):
+            with open(test_suite_path) as f_test_suite:
+                test_suites[test_suite_path] = f_test_suite.read()
+        distinct_test_suites = list(dict.fromkeys(test_suites.values()))
+        print(
+            f"Analyze {len(distinct_test_suites)} distinct test suites of {len(all_test_suite_stats)} scenarios ..."
+        )
+        with ProcessPoolExecutor() as executor:
+            test_case_counts = list(
+                executor.map(_count_test_cases, distinct_test_suites, chunksize=16)
+            )
+        token_index = TokenIndex()
+        num_gpt_tokens = token_index.count_tokens(
+            "tiktoken/cl100k_base", distinct_test_suites
+        )
+        num_llama_tokens = token_index.count_tokens(
+            "huggingface/meta-llama/Meta-Llama-3-8B", distinct_test_suites
+        )
+        suite_stats = {
+            test_suite: {
+                "test_case_count": test_case_count,
+                "num_chars": len(test_suite),
+                "num_gpt_tokens": gpt_tokens,
+                "num_llama_tokens": llama_tokens,
+            }
+            for test_suite, test_case_count, gpt_tokens, llama_tokens in zip(
+                distinct_test_suites, test_case_counts, num_gpt_tokens, num_llama_tokens
+            )
+        }
+        # Write statistics of all scenarios in one pass
+        with open(test_suite_stats_path, "w") as f:
+            for test_suite_stats, test_suite_path in zip(
+                all_test_suite_stats, test_suite_paths
+            ):
+                test_suite_stats.update(suite_stats[test_suites[test_suite_path]])
+                f.write(json.dumps(test_suite_stats) + "\n")
 
     def run_experiments(self):
         """
         Entry point for CLI to run querying experiments over all projects.
         """
         experiments = self._extract_experiments()
+        prefetch_metadata(defects4j_project_paths=[exp["path"] for exp in experiments])
+        with self.results_sink:
+            asyncio.run(self._query_experiments(experiments))
+
+    async def _query_experiments(self, experiments: list):
+        """
+        Queries bugs of Java projects concurrently.
+
+        At most num_workers bugs are processed and num_workers queries are sent to the LLM at the same time.
+        """
         num_exps = len(experiments)
-        # Iterate over Java projects
-        for i, exp in enumerate(experiments):
-            project = exp["project"]
-            bug = exp["bug"]
-            exp_path = exp["path"]
-            print(f"[{i + 1}/{num_exps}] - Processing project {project} bug {bug} ...")
-            self.query(project, bug, exp_path)
+        self.query_semaphore = asyncio.Semaphore(self.num_workers)
+        bug_semaphore = asyncio.Semaphore(self.num_workers)
+
+        async def query_experiment(i: int, exp: dict):
+            async with bug_semaphore:
+                project = exp["project"]
+                bug = exp["bug"]
+                print(f"[{i + 1}/{num_exps}] - Processing project {project} bug {bug} ...")
+                await self.query(project, bug, exp["path"])
 
-    def query(self, project: str, bug: str, exp_path: str):
+        await asyncio.gather(
+            *(query_experiment(i, exp) for i, exp in enumerate(experiments))
+        )
+
+    async def query(self, project: str, bug: str, exp_path: str):
         """
         Queries LLM with context from RAG.
         """
-        query_engine, index_nanoseconds = self._build_query_engine(exp_path)
+        # Index in a thread so that queries of other bugs keep running
+        query_engine, index_nanoseconds, is_index_cached = await asyncio.to_thread(
+            self._build_query_engine, project, exp_path
+        )
         components_list = self._read_project_components(
             exp_path.replace(f"{bug}f", f"{bug}b"), project, bug
         )
@@ -330,6 +415,7 @@ class RagQueryHandler:
             "dataset_path": exp_path,
             "scenarios": [],
             "index_nanoseconds": index_nanoseconds,
+            "index_from_cache": is_index_cached,
         }
         if self.chosen_scenario is PromptKind.SIMILAR:
             # Read the only similar scenario
@@ -347,7 +433,7 @@ class RagQueryHandler:
         prompt_details["scenario_index"] = scenario_index
         prompt_details["queries"] = []
         try:
-            self._query_scenario(metadata, query_engine, prompt_details, scenario)
+            await self._query_scenario(metadata, query_engine, prompt_details, scenario)
         except Exception as e:
             # Skip scenario with query exception
             return
@@ -355,45 +441,72 @@ class RagQueryHandler:
         scenario["classified_scenario"] = self.vote_scenario(scenario)
         answers["scenarios"].append(scenario)
         # Append prompt details to JSON lines
-        with open(prompt_path, "a") as f:
-            f.write(json.dumps(prompt_details) + "\n")
+        self.results_sink.write_jsonl(prompt_path, prompt_details)
         # Append answers to JSON lines
-        with open(summary_path, "a") as f:
-            f.write(json.dumps(answers) + "\n")
+        self.results_sink.write_jsonl(summary_path, answers)
+
+    async def _query_scenario(self, metadata: dict, query_engine: EtestQueryEngine, prompt_details: dict, scenario: dict):
+        # Query all questions about the scenario described by metadata concurrently
+        results = await asyncio.gather(
+            *(self._query_question(query, metadata, query_engine) for query in self.queries)
+        )
+        for query, (query_detail, answer) in zip(self.queries, results):
+            prompt_details["queries"].append(query_detail)
+            scenario[query] = answer
+
+    @staticmethod
+    def get_scenario_context(metadata: dict) -> str:
+        """
+        Returns the parts of the scenario described by metadata that all questions embed.
+        """
+        return "\n\n".join(
+            [
+                metadata["monitored_scenario"],
+                metadata["test_suite"],
+                metadata["buggy_class_name"],
+                metadata["buggy_method_name"],
+            ]
+        )
 
-    def _query_scenario(self, metadata: dict, query_engine: EtestQueryEngine, prompt_details: dict, scenario: dict):
-        # Query with scenario described by metadata
-        for query in self.queries:
-            prompt = self.qa_template["questions"][query].format(
-                monitored_scenario=metadata["monitored_scenario"],
-                test_suite=metadata["test_suite"],
-                class_name=metadata["buggy_class_name"],
-                method_name=metadata["buggy_method_name"],
+    async def _query_question(self, query: str, metadata: dict, query_engine: EtestQueryEngine) -> tuple:
+        """
+        Queries a question about the scenario described by metadata, counting tokens consumed by this query only.
+
+        Returns
+        -------
+        tuple(dict, str) : the query details and the answer
+        """
+        prompt = self.qa_template["questions"][query].format(
+            monitored_scenario=metadata["monitored_scenario"],
+            test_suite=metadata["test_suite"],
+            class_name=metadata["buggy_class_name"],
+            method_name=metadata["buggy_method_name"],
+        )
+        if self.is_shared_retrieval:
+            # Retrieve context for the scenario shared by all questions
+            query_bundle = QueryBundle(
+                prompt, custom_embedding_strs=[RagQueryHandler.get_scenario_context(metadata)]
             )
+        else:
+            query_bundle = QueryBundle(prompt)
+        async with self.query_semaphore:
+            # Each question runs in its own task, so the token counts are not shared with other queries
+            token_counts = {"total_llm_token_count": 0, "prompt_llm_token_count": 0}
+            current_query_token_counts.set(token_counts)
             query_time_start = time.time_ns()
-            query_answer = query_engine.query(prompt)
+            query_answer = await query_engine.aquery(query_bundle)
             elapsed_nanoseconds = time.time_ns() - query_time_start
-            # Save query details
-            query_detail = dict(query_engine.prompt_dict)
-            query_detail["query"] = query
-            query_detail["answer"] = str(query_answer)
-            query_detail["elapsed_nanoseconds"] = elapsed_nanoseconds
-            # Count consumed tokens
-            query_detail["total_llm_token_count"] = (
-                self.token_counter.total_llm_token_count
-                - self.total_llm_token_count
-            )
-            self.total_llm_token_count = self.token_counter.total_llm_token_count
-            query_detail["prompt_llm_token_count"] = (
-                self.token_counter.prompt_llm_token_count
-                - self.prompt_llm_token_count
-            )
-            self.prompt_llm_token_count = self.token_counter.prompt_llm_token_count
-            prompt_details["queries"].append(query_detail)
-            # Save answer
-            if self.chosen_llm is LLMKind.Deepseek_R1_70B:
-                query_answer = re.sub(r"<think>.*?</think>", "", query_answer.response, flags=re.DOTALL).strip()
-            scenario[query] = str(query_answer)
+        # Save query details
+        query_detail = dict(query_answer.metadata)
+        query_detail["query"] = query
+        query_detail["answer"] = str(query_answer)
+        query_detail["elapsed_nanoseconds"] = elapsed_nanoseconds
+        # Count consumed tokens
+        query_detail.update(token_counts)
+        # Save answer
+        if self.chosen_llm is LLMKind.Deepseek_R1_70B:
+            return query_detail, re.sub(r"<think>.*?</think>", "", query_answer.response, flags=re.DOTALL).strip()
+        return query_detail, str(query_answer)
 
     def vote_scenario(self, answers: dict):
         scenario_vote = {}
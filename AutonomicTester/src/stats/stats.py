@@ -1,11 +1,16 @@
 import json
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import pandas as pd
 
+from src.output.output import parse_results, read_validation_prompts
 from src.prompt.prompt_kind import PromptKind
 from src import DEFACTS4J_PROMPT_PATH, EXPERIMENT_RESULTS_PATH, PROMPT_TEMPLATE_PATH
 
+ALL_ANSWERS_FILE = "all_answers.csv"  # answers of all summarized experiments
+
 
 def summarize_prompt_statistics_for_defects4j(version):
     prompts = []
@@ -40,62 +45,63 @@ def summarize_prompt_statistics_for_defects4j(version):
     )
 
 
-def analyze_answers_from_summary(experiment_folder, prompt_version, queries, path):
-    answer_fn = f"answers_v{prompt_version}.json"
-    with open(os.path.join(PROMPT_TEMPLATE_PATH, answer_fn)) as answer_file:
-        answers = json.load(answer_file)
-    with open(os.path.join(path, experiment_folder, "summary.json")) as f:
-        results = json.load(f)
+def encode_answers_and_votes(df_results, answers, queries):
+    """
+    Encodes answers as correct or incorrect and votes for scenarios over a table of answers.
 
-    # Vote for category using the number of correct results for 3 scenarios
-    votes = []
-    encoded_answers = []
-    for result in results:
-        result_id = result["id"]
-        matched_prompt = re.search(
-            r"prompt_(buggy|fixed|similar)_(\d+)_([-A-Za-z]+)_v\d+_result.txt",
-            result_id,
-        )
-        if not matched_prompt:
-            print(f"Fail to match result file name: {result_id}!")
-            continue
-        true_scenario = matched_prompt.group(1)
-        bug_id = int(matched_prompt.group(2))
-        project = matched_prompt.group(3)
-        # Encode answers with 0 meaning incorrect and 1 meaning correct
-        encoded_answer = {"bug id": bug_id, "project": project, "truth": true_scenario}
-        true_answers = {q: answers[true_scenario.upper()][q] for q in queries}
-        for question_id, answer in true_answers.items():
-            if question_id in result and result[question_id] == answer:
-                encoded_answer[question_id] = 1
-            else:
-                encoded_answer[question_id] = 0
-        encoded_answers.append(encoded_answer)
-
-        # Voting
-        vote = {"bug id": bug_id, "project": project, "truth": true_scenario}
-        # Compute the number of correct results for each scenario
-        for scenario in [p.name.lower() for p in PromptKind]:
-            vote[scenario] = 0
-            scenario_answers = {q: answers[scenario.upper()][q] for q in queries}
-            for question_id, answer in scenario_answers.items():
-                # correct answer
-                if question_id in result and result[question_id] == answer:
-                    vote[scenario] += 1
-        # Vote for majority
-        votes.append(vote)
-
-    df_encoded_answers = pd.DataFrame(encoded_answers)
+    Parameters
+    ----------
+    - df_results : DataFrame with the result file name as id and one column of answers per query
+    - answers : dict of correct answers per scenario
+    - queries : list of query IDs
+
+    Returns
+    -------
+    tuple(DataFrame, DataFrame) : encoded answers and scenario votes
+    """
+    df_results = df_results.reset_index(drop=True)
+    matched_prompts = df_results["id"].str.extract(
+        r"prompt_(buggy|fixed|similar)_(\d+)_([-A-Za-z]+)_v\d+_result.txt"
+    )
+    for result_id in df_results.loc[matched_prompts[0].isna(), "id"]:
+        print(f"Fail to match result file name: {result_id}!")
+    is_matched = matched_prompts[0].notna()
+    df_results = df_results[is_matched]
+    matched_prompts = matched_prompts[is_matched]
+    # answers missing from results never match
+    df_answers = df_results.reindex(columns=queries)
+    df_info = pd.DataFrame(
+        {
+            "bug id": matched_prompts[1].astype(int),
+            "project": matched_prompts[2],
+            "truth": matched_prompts[0],
+        }
+    )
+    df_correct_answers = pd.DataFrame(answers).T
+    # Encode answers with 0 meaning incorrect and 1 meaning correct
+    true_answers = df_correct_answers.loc[
+        df_info["truth"].str.upper(), queries
+    ].set_axis(df_answers.index)
+    df_encoded_answers = pd.concat(
+        [df_info, (df_answers == true_answers).astype(int)], axis=1
+    )
+    # Compute the number of correct results for each scenario
+    df_votes = df_info.copy()
+    for scenario in [p.name.lower() for p in PromptKind]:
+        scenario_answers = df_correct_answers.loc[scenario.upper(), queries]
+        df_votes[scenario] = (df_answers == scenario_answers).sum(axis=1)
     df_encoded_answers.sort_values(by=["project", "bug id"], inplace=True)
+    df_votes.sort_values(by=["project", "bug id"], inplace=True)
+    df_votes["max"] = df_votes[["buggy", "fixed", "similar"]].max(axis=1)
+    df_votes["scenario"] = df_votes[["buggy", "fixed", "similar"]].idxmax(axis=1)
+    return df_encoded_answers, df_votes
+
+
+def _save_encoded_answers_and_votes(df_encoded_answers, df_votes, experiment_folder, path):
     df_encoded_answers.to_csv(
         os.path.join(path, experiment_folder, "encoded_answers.csv"),
         index=False,
     )
-
-    df_votes = pd.DataFrame(votes)
-    df_votes.sort_values(by=["project", "bug id"], inplace=True)
-    df_votes["max"] = df_votes[["buggy", "fixed", "similar"]].max(axis=1)
-    df_votes["scenario"] = df_votes[["buggy", "fixed", "similar"]].idxmax(axis=1)
     equal_vote_rows = df_votes[
         (df_votes["buggy"] == df_votes["fixed"])
         & (df_votes["buggy"] == df_votes["max"])
@@ -111,11 +117,104 @@ def analyze_answers_from_summary(experiment_folder, prompt_version, queries, pat
         os.path.join(path, experiment_folder, "scenario_votes.csv"),
         index=False,
     )
-    num_correct = (df_votes["scenario"] == true_scenario).sum()
+    if df_votes.empty:
+        print(f"No results to analyze in {experiment_folder}")
+        return
+    num_correct = (df_votes["scenario"] == df_votes["truth"]).sum()
     accuracy = num_correct / len(df_votes)
     print(f"The accuracy of {experiment_folder} is {accuracy:.4f}")
 
 
+def analyze_answers_from_summary(experiment_folder, prompt_version, queries, path):
+    answer_fn = f"answers_v{prompt_version}.json"
+    with open(os.path.join(PROMPT_TEMPLATE_PATH, answer_fn)) as answer_file:
+        answers = json.load(answer_file)
+    with open(os.path.join(path, experiment_folder, "summary.json")) as f:
+        results = json.load(f)
+
+    # Vote for category using the number of correct results for 3 scenarios
+    df_encoded_answers, df_votes = encode_answers_and_votes(
+        pd.DataFrame(results, columns=["id"] + queries), answers, queries
+    )
+    _save_encoded_answers_and_votes(df_encoded_answers, df_votes, experiment_folder, path)
+
+
+def _summarize_experiment(experiment_path, version, validation_prompts):
+    """
+    Parses and stores the summary of an experiment in a worker process.
+    """
+    dirpath, dirname = os.path.split(experiment_path)
+    print(f"Summarize experiment {experiment_path}")
+    results = parse_results(dirname, version, dirpath, validation_prompts)
+    with open(os.path.join(experiment_path, "summary.json"), "w") as f:
+        f.write(json.dumps(results, sort_keys=True, indent=4))
+    return results
+
+
+def summarize_all_experiments(version, queries, path, is_validation=False):
+    """
+    Summarizes and analyzes all experiments in the path in a single pass.
+
+    Result files are parsed in parallel processes into one table of answers saved to the path,
+    then answers of all experiments are encoded and voted together.
+    """
+    experiment_paths = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        if "arguments.json" in filenames:
+            experiment_paths.append(dirpath)
+    experiment_paths.sort()
+    if not experiment_paths:
+        print(f"No experiments to summarize in {path}")
+        return
+    validation_prompts = read_validation_prompts() if is_validation else None
+    with ProcessPoolExecutor() as executor:
+        experiments_results = executor.map(
+            _summarize_experiment,
+            experiment_paths,
+            repeat(version),
+            repeat(validation_prompts),
+        )
+        df_results = pd.concat(
+            [
+                pd.DataFrame(results, columns=["id"] + queries).assign(
+                    experiment=experiment_path
+                )
+                for experiment_path, results in zip(experiment_paths, experiments_results)
+            ],
+            ignore_index=True,
+        )
+    df_results[["experiment", "id"] + queries].to_csv(
+        os.path.join(path, ALL_ANSWERS_FILE), index=False
+    )
+
+    with open(
+        os.path.join(PROMPT_TEMPLATE_PATH, f"answers_v{version}.json")
+    ) as answer_file:
+        answers = json.load(answer_file)
+    df_encoded_answers, df_votes = encode_answers_and_votes(df_results, answers, queries)
+    df_encoded_answers["experiment"] = df_results.loc[df_encoded_answers.index, "experiment"]
+    df_votes["experiment"] = df_results.loc[df_votes.index, "experiment"]
+    encoded_answers_by_experiment = dict(
+        tuple(df_encoded_answers.drop(columns="experiment").groupby(df_encoded_answers["experiment"]))
+    )
+    votes_by_experiment = dict(
+        tuple(df_votes.drop(columns="experiment").groupby(df_votes["experiment"]))
+    )
+    for experiment_path in experiment_paths:
+        dirpath, dirname = os.path.split(experiment_path)
+        # experiments without matched results have no group and are saved empty
+        _save_encoded_answers_and_votes(
+            encoded_answers_by_experiment.get(
+                experiment_path, df_encoded_answers.iloc[:0].drop(columns="experiment")
+            ),
+            votes_by_experiment.get(
+                experiment_path, df_votes.iloc[:0].drop(columns="experiment")
+            ),
+            dirname,
+            dirpath,
+        )
+
+
 def analyze_answers_from_summary_in_binary_classification(
     experiment_folder, prompt_version
 ):
@@ -5,11 +5,16 @@ import shutil
 import subprocess
 import logging
 from src.testexe.iohelper import add_generated_test_case, get_generated_test_name
+from src.utils.defects4j_util import export_property, get_trigger_tests
 import pandas as pd
 from io import StringIO
 
 
 class Defects4jDriver:
+    CHECKOUT_CACHE_PATH = os.path.join(
+        ".", "Defects4jDataset", "checkout_cache"
+    )  # pristine checkouts shared by all experiments
+
     def __init__(self, bug_id, project_id, timestamp):
         self.bug_id = bug_id
         self.project_id = project_id
@@ -31,32 +36,65 @@ class Defects4jDriver:
     def finish_parsing(self):
         return os.path.exists(self._get_checkout_path("b")) and os.path.exists(self._get_checkout_path("f"))
 
+    def _get_pristine_path(self, version):
+        # version is either character b or f.
+        return os.path.join(
+            Defects4jDriver.CHECKOUT_CACHE_PATH,
+            self.project_id,
+            f"{self.bug_id}{version}",
+        )
+
+    def _prepare_workspace(self, version):
+        """
+        Prepares the checkout of a version with the original trigger test suite.
+
+        The version is checked out once into the pristine cache shared by all experiments.
+        The workspace is copied from it at the first attempt, then only the modified test suite is restored.
+        Returns None if the version fails to be checked out.
+        """
+        pristine_path = self._get_pristine_path(version)
+        if not os.path.exists(pristine_path):
+            # check out to a temporary folder to never leave a partial checkout in the cache
+            tmp_pristine_path = pristine_path + ".tmp"
+            if os.path.exists(tmp_pristine_path):
+                shutil.rmtree(tmp_pristine_path)
+            self._checkout_project_version(version, tmp_pristine_path)
+            if not os.path.exists(tmp_pristine_path):
+                return None
+            os.rename(tmp_pristine_path, pristine_path)
+        checkout_path = self._get_checkout_path(version)
+        if not os.path.exists(checkout_path):
+            logging.info(f"Copy pristine checkout {pristine_path} to {checkout_path}.")
+            shutil.copytree(pristine_path, checkout_path, symlinks=True)
+            return self._extract_trigger_test(checkout_path)
+        trigger_test_path, trigger_test_name, test_method_name = (
+            self._extract_trigger_test(checkout_path)
+        )
+        # restore the test suite augmented by the previous attempt
+        shutil.copy2(
+            os.path.join(pristine_path, os.path.relpath(trigger_test_path, checkout_path)),
+            trigger_test_path,
+        )
+        return trigger_test_path, trigger_test_name, test_method_name
+
     def augment_test_suite_with_generated_test_case(
         self, generated_test_case
     ):
         # add test case to buggy version
-        checkout_path_buggy = self._get_checkout_path("b")
-        if os.path.exists(checkout_path_buggy):
-            # delete folder to check again
-            shutil.rmtree(checkout_path_buggy)
-        self._checkout_project_version("b", checkout_path_buggy)
-        trigger_test_path, _, test_method_name = self._extract_trigger_test(
-            checkout_path_buggy
-        )
+        workspace = self._prepare_workspace("b")
+        if workspace is None:
+            return None
+        trigger_test_path, _, test_method_name = workspace
         add_state = add_generated_test_case(
             trigger_test_path, test_method_name, generated_test_case
         )
         if add_state is None:
             return None
         # add test case to fixed version
-        checkout_path_fixed = self._get_checkout_path("f")
-        if os.path.exists(checkout_path_fixed):
-            # delete folder to check again
-            shutil.rmtree(checkout_path_fixed)
-        self._checkout_project_version("f", checkout_path_fixed)
-        trigger_test_path, _, test_method_name = self._extract_trigger_test(
-            checkout_path_fixed
-        )
+        workspace = self._prepare_workspace("f")
+        if workspace is None:
+            return None
+        trigger_test_path, _, test_method_name = workspace
         add_state = add_generated_test_case(
             trigger_test_path, test_method_name, generated_test_case
         )
@@ -137,12 +175,8 @@ class Defects4jDriver:
             logging.error("\n" + result.stderr)
 
     def _extract_trigger_test(self, checkout_path):
-        command = f"defects4j info -p {self.project_id} -b {self.bug_id}"
-        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-        # Regular expression to match both the full test name and the specific test method
-        pattern = r"Root cause in triggering tests:\n(?:\s+-\s+([\w\.\:]+::(\w+)))"
-        # Find all matches
-        matches = re.findall(pattern, result.stdout)
+        # Trigger tests and source folders are read from the Defects4J metadata cache
+        matches = get_trigger_tests(self.project_id, self.bug_id)
         # Print extracted test names and specific test methods
         trigger_test_name = ""
         test_method_name = ""
@@ -151,29 +185,15 @@ class Defects4jDriver:
             trigger_test_name = full_name
             test_path = full_name
             test_method_name = method
-        # Output results
-        if result.stdout and result.returncode != 0:
-            logging.error("\n" + result.stdout)
-        if result.stderr and result.returncode != 0:
-            logging.error("\n" + result.stderr)
 
         # get path to source test
-        command = f"defects4j export -p dir.src.tests"
-        result = subprocess.run(
-            command, cwd=checkout_path, shell=True, capture_output=True, text=True
-        )
         trigger_test_path = os.path.join(
             checkout_path,
-            result.stdout,
+            export_property(checkout_path, "dir.src.tests"),
             test_path.split("::")[0].replace(".", "/") + ".java",
         )
         logging.info(f"Extract complete path to source test file: {trigger_test_path}")
         logging.info(f"Extract full name of trigger test: {trigger_test_name}")
-        # Output results
-        if result.stdout and result.returncode != 0:
-            logging.error("\n" + result.stdout)
-        if result.stderr and result.returncode != 0:
-            logging.error("\n" + result.stderr)
 
         return trigger_test_path, trigger_test_name, test_method_name
 
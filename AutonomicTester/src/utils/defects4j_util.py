@@ -1,18 +1,140 @@
+import json
+import logging
 import os
+import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
+from src import DEFACTS4J_PATH
 
-def get_src_class_path(defects4j_project_path: str):
-    command = "defects4j export -p dir.src.classes"
+DEFECTS4J_METADATA_PATH = os.path.join(DEFACTS4J_PATH, "metadata.json")
+
+# Metadata of Defects4J bugs keyed by <project>/<bug> and of their versions keyed by <project>/<bug><version>
+_metadata = None
+_metadata_lock = Lock()
+
+
+def _get_metadata() -> dict:
+    global _metadata
+    if _metadata is None:
+        _metadata = {}
+        if os.path.exists(DEFECTS4J_METADATA_PATH):
+            with open(DEFECTS4J_METADATA_PATH) as f:
+                _metadata = json.load(f)
+    return _metadata
+
+
+def _save_metadata():
+    with open(DEFECTS4J_METADATA_PATH, "w") as f:
+        json.dump(_metadata, f, sort_keys=True, indent=4)
+
+
+def _lookup_metadata(key: str, field: str, compute, save: bool):
+    """
+    Returns the cached metadata field or computes it with a defects4j command and caches it.
+    """
+    with _metadata_lock:
+        metadata = _get_metadata()
+        if field in metadata.get(key, {}):
+            return metadata[key][field]
+    value = compute()
+    if value is None:
+        # do not cache failed commands
+        return None
+    with _metadata_lock:
+        _get_metadata().setdefault(key, {})[field] = value
+        if save:
+            _save_metadata()
+    return value
+
+
+def _get_version_key(defects4j_project_path: str) -> str:
+    # checkouts are stored in folders <project>/<bug><version>
+    normalized_path = os.path.normpath(defects4j_project_path)
+    return "/".join(
+        [
+            os.path.basename(os.path.dirname(normalized_path)),
+            os.path.basename(normalized_path),
+        ]
+    )
+
+
+def _run_defects4j(command: str, cwd: str = None) -> str | None:
     result = subprocess.run(
-        command, shell=True, cwd=defects4j_project_path, capture_output=True, text=True
+        command, shell=True, cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        if result.stdout:
+            logging.error("\n" + result.stdout)
+        if result.stderr:
+            logging.error("\n" + result.stderr)
+        return None
+    return result.stdout
+
+
+def export_property(defects4j_project_path: str, property_name: str, save: bool = True) -> str:
+    value = _lookup_metadata(
+        _get_version_key(defects4j_project_path),
+        property_name,
+        lambda: _run_defects4j(
+            f"defects4j export -p {property_name}", cwd=defects4j_project_path
+        ),
+        save,
+    )
+    return "" if value is None else value
+
+
+def get_src_class_path(defects4j_project_path: str):
+    return os.path.join(
+        defects4j_project_path,
+        export_property(defects4j_project_path, "dir.src.classes"),
     )
-    return os.path.join(defects4j_project_path, result.stdout)
 
 
 def get_src_tests_path(defects4j_project_path: str):
-    command = "defects4j export -p dir.src.tests"
-    result = subprocess.run(
-        command, shell=True, cwd=defects4j_project_path, capture_output=True, text=True
+    return os.path.join(
+        defects4j_project_path,
+        export_property(defects4j_project_path, "dir.src.tests"),
+    )
+
+
+def get_trigger_tests(project_id: str, bug_id: str, save: bool = True) -> list:
+    """
+    Returns a list of pairs of the full name and the method name of trigger tests.
+    """
+
+    def extract_trigger_tests():
+        stdout = _run_defects4j(f"defects4j info -p {project_id} -b {bug_id}")
+        if stdout is None:
+            return None
+        # Regular expression to match both the full test name and the specific test method
+        pattern = r"Root cause in triggering tests:\n(?:\s+-\s+([\w\.\:]+::(\w+)))"
+        return [list(match) for match in re.findall(pattern, stdout)]
+
+    value = _lookup_metadata(
+        f"{project_id}/{bug_id}", "trigger_tests", extract_trigger_tests, save
     )
-    return os.path.join(defects4j_project_path, result.stdout)
\ No newline at end of file
+    return [] if value is None else value
+
+
+def prefetch_metadata(project_bugs: list = (), defects4j_project_paths: list = ()):
+    """
+    Populates the metadata cache in bulk with trigger tests of bugs and source folders of checkouts.
+
+    Parameters
+    ----------
+    - project_bugs : list of pairs of project ID and bug ID
+    - defects4j_project_paths : list of paths to checkouts
+    """
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for project_id, bug_id in project_bugs:
+            executor.submit(get_trigger_tests, project_id, bug_id, False)
+        for defects4j_project_path in defects4j_project_paths:
+            for property_name in ["dir.src.classes", "dir.src.tests"]:
+                executor.submit(
+                    export_property, defects4j_project_path, property_name, False
+                )
+    with _metadata_lock:
+        _get_metadata()
+        _save_metadata()
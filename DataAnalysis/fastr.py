@@ -15,15 +15,19 @@ along with this source.  If not, see <http://www.gnu.org/licenses/>.
 
 from collections import defaultdict
 from collections import OrderedDict
+import hashlib
+import itertools
+import json
 import math
 import os
-import pickle
 import random
 import sys
 import time
 
 from functools import reduce
 import numpy as np
+from numpy.lib.format import open_memmap
+from scipy.sparse import csr_matrix
 
 from sklearn.feature_extraction.text import HashingVectorizer
 from sklearn.random_projection import johnson_lindenstrauss_min_dim
@@ -58,12 +62,29 @@ def loadTestSuite(input_file, bbox=False, k=5):
         newTS = lsh.kShingles(TS, k)
     return newTS
 
+# hash the content of a file
+def fileHash(inputFile):
+    sha = hashlib.sha256()
+    with open(inputFile, "rb") as fin:
+        for block in iter(lambda: fin.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+# number of test cases shingled and minhashed at once
+SIGNATURE_CHUNK_SIZE = 10000
+
 # store signatures on disk for future re-use
-def storeSignatures(input_file, sigfile, hashes, bbox=False, k=5):
-    with open(sigfile, "w") as sigfile:
-        with open(input_file) as fin:
-            tcID = 1
-            for tc in fin:
+def storeSignatures(input_file, sigfile, family, bbox=False, k=5):
+    with open(input_file) as fin:
+        numTestCases = sum(1 for line in fin)
+    # uint64 matrix with the signature of the i-th test case in row i-1
+    signatures = open_memmap(sigfile, mode="w+", dtype=np.uint64,
+                             shape=(numTestCases, len(family[0])))
+    with open(input_file) as fin:
+        start = 0
+        while True:
+            test_cases = []
+            for tc in itertools.islice(fin, SIGNATURE_CHUNK_SIZE):
                 if bbox:
                     # shingling
                     tc_ = tc[:-1]
@@ -71,26 +92,53 @@ def storeSignatures(input_file, sigfile, hashes, bbox=False, k=5):
                     for i in range(len(tc_) - k + 1):
                         tc_shingles.add(hash(tc_[i:i + k]))
 
-                    sig = lsh.tcMinhashing((tcID, set(tc_shingles)), hashes)
+                    test_cases.append((start + len(test_cases) + 1, tc_shingles))
                 else:
                     tc_ = tc[:-1].split()
-                    sig = lsh.tcMinhashing((tcID, set(tc_)), hashes)
-                for hash_ in sig:
-                    sigfile.write(hash_)
-                    sigfile.write(" ")
-                sigfile.write("\n")
-                tcID += 1
-
-# load stored signatures
+                    test_cases.append((start + len(test_cases) + 1, set(tc_)))
+            if len(test_cases) == 0:
+                break
+            tc_IDs, chunk_signatures = lsh.tsMinhashing(test_cases, family)
+            signatures[start:start + len(test_cases)] = chunk_signatures
+            start += len(test_cases)
+
+    signatures.flush()
+
+# load stored signatures memory-mapped without parsing
+# (the signature of test case tcID is in row tcID-1)
 def loadSignatures(input_file):
-    sig = {}
-    start = time.clock()
-    with open(input_file, "r") as fin:
-        tcID = 1
-        for tc in fin:
-            sig[tcID] = [i.strip() for i in tc[:-1].split()]
-            tcID += 1
-    return sig, time.clock() - start
+    start = time.perf_counter()
+    sig = np.load(input_file, mmap_mode="r")
+    return sig, time.perf_counter() - start
+
+# store signatures unless stored for the same input and parameters, return minhashing time
+def prepareSignatures(input_file, family, r, b, bbox=False, k=5):
+    """INPUT
+    (str)input_file: test suite file, signatures are stored next to it
+    (pair)family: coefficients of hash functions from lsh.minhashFamily
+    (int)r, b: number of rows and bands
+
+    OUTPUT
+    (str)sigfile: .sig.npy file of signatures
+    (float)mh_time: time to compute the signatures, read from the JSON header if stored"""
+    sigfile = input_file.replace(".txt", ".sig.npy")
+    headerfile = input_file.replace(".txt", ".sig.json")
+    header = {"input_hash": fileHash(input_file), "r": r, "b": b, "k": k,
+              "bbox": bbox}
+
+    if os.path.exists(sigfile) and os.path.exists(headerfile):
+        with open(headerfile, "r") as fin:
+            stored_header = json.load(fin)
+        if all(stored_header.get(key) == value for key, value in header.items()):
+            return sigfile, stored_header["mh_time"]
+
+    mh_t = time.perf_counter()
+    storeSignatures(input_file, sigfile, family, bbox, k)
+    header["mh_time"] = time.perf_counter() - mh_t
+    # the header is written last so that an interrupted store is redone
+    with open(headerfile, "w") as fout:
+        json.dump(header, fout)
+    return sigfile, header["mh_time"]
 
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
@@ -100,106 +148,76 @@ def loadSignatures(input_file):
 def fast_pw(input_file, r, b, bbox=False, k=5, memory=False, B=0):
     n = r * b  # number of hash functions
 
-    hashes = [lsh.hashFamily(i) for i in range(n)]
+    family = lsh.minhashFamily(n)
 
     if memory:
         test_suite = loadTestSuite(input_file, bbox=bbox, k=k)
         # generate minhashes signatures
-        mh_t = time.clock()
-        tcs_minhashes = {tc[0]: lsh.tcMinhashing(tc, hashes)
-                         for tc in test_suite.items()}
-        mh_time = time.clock() - mh_t
-        ptime_start = time.clock()
+        mh_t = time.perf_counter()
+        tc_IDs, signatures = lsh.tsMinhashing(test_suite.items(), family)
+        mh_time = time.perf_counter() - mh_t
+        ptime_start = time.perf_counter()
 
     else:
         # loading input file and generating minhashes signatures
-        sigfile = input_file.replace(".txt", ".sig")
-        sigtimefile = "{}_sigtime.txt".format(input_file.split(".")[0])
-        if not os.path.exists(sigfile):
-            mh_t = time.clock()
-            storeSignatures(input_file, sigfile, hashes, bbox, k)
-            mh_time = time.clock() - mh_t
-            with open(sigtimefile, "w") as fout:
-                fout.write(repr(mh_time))
-        else:
-            with open(sigtimefile, "r") as fin:
-                mh_time = eval(fin.read().replace("\n", ""))
+        sigfile, mh_time = prepareSignatures(input_file, family, r, b,
+                                             bbox, k)
 
-        ptime_start = time.clock()
-        tcs_minhashes, load_time = loadSignatures(sigfile)
-
-    tcs = set(tcs_minhashes.keys())
+        ptime_start = time.perf_counter()
+        signatures, load_time = loadSignatures(sigfile)
+        tc_IDs = list(range(1, len(signatures) + 1))
 
     # budget B modification
     if B == 0:
-        B = len(tcs)
-
-    BASE = 0.5
-    SIZE = int(len(tcs)*BASE) + 1
+        B = len(tc_IDs)
 
-    bucket = lsh.LSHBucket(tcs_minhashes.items(), b, r, n)
+    # test cases are identified by their row in signatures
+    index = lsh.LSHIndex(signatures, b, r)
 
     prioritized_tcs = [0]
 
     # First TC
 
-    selected_tcs_minhash = lsh.tcMinhashing((0, set()), hashes)
-    first_tc = random.choice(list(tcs_minhashes.keys()))
-    for i in range(n):
-        if tcs_minhashes[first_tc][i] < selected_tcs_minhash[i]:
-            selected_tcs_minhash[i] = tcs_minhashes[first_tc][i]
-    prioritized_tcs.append(first_tc)
-    tcs -= set([first_tc])
-    del tcs_minhashes[first_tc]
-
-    iteration, total = 0, float(len(tcs_minhashes))
-    while len(tcs_minhashes) > 0:
+    selected_tcs_minhash = lsh.emptySignature(family)
+    first_tc = random.randrange(len(tc_IDs))
+    np.minimum(selected_tcs_minhash, signatures[first_tc],
+               out=selected_tcs_minhash)
+    prioritized_tcs.append(tc_IDs[first_tc])
+    index.remove(first_tc)
+
+    iteration, total = 0, float(index.size)
+    while index.size > 0:
         iteration += 1
         if iteration % 100 == 0:
             sys.stdout.write("  Progress: {}%\r".format(
                 round(100*iteration/total, 2)))
             sys.stdout.flush()
 
-        if len(tcs_minhashes) < SIZE:
-            bucket = lsh.LSHBucket(tcs_minhashes.items(), b, r, n)
-            SIZE = int(SIZE*BASE) + 1
-
-        sim_cand = lsh.LSHCandidates(bucket, (0, selected_tcs_minhash),
-                                     b, r, n)
-        filtered_sim_cand = sim_cand.difference(prioritized_tcs)
-        candidates = tcs - filtered_sim_cand
+        candidates = index.dissimilar(selected_tcs_minhash)
 
         if len(candidates) == 0:
-            selected_tcs_minhash = lsh.tcMinhashing((0, set()), hashes)
-            sim_cand = lsh.LSHCandidates(bucket, (0, selected_tcs_minhash),
-                                         b, r, n)
-            filtered_sim_cand = sim_cand.difference(prioritized_tcs)
-            candidates = tcs - filtered_sim_cand
+            selected_tcs_minhash = lsh.emptySignature(family)
+            candidates = index.dissimilar(selected_tcs_minhash)
             if len(candidates) == 0:
-                candidates = tcs_minhashes.keys()
+                candidates = index.remaining()
 
-        selected_tc, max_dist = random.choice(tuple(candidates)), -1
-        for candidate in tcs_minhashes:
-            if candidate in candidates:
-                dist = lsh.jDistanceEstimate(
-                    selected_tcs_minhash, tcs_minhashes[candidate])
-                if dist > max_dist:
-                    selected_tc, max_dist = candidate, dist
+        # farthest candidate, the first one in case of ties
+        dists = lsh.jDistanceEstimates(selected_tcs_minhash,
+                                       signatures[candidates])
+        selected_tc = candidates[np.argmax(dists)]
 
-        for i in range(n):
-            if tcs_minhashes[selected_tc][i] < selected_tcs_minhash[i]:
-                selected_tcs_minhash[i] = tcs_minhashes[selected_tc][i]
+        np.minimum(selected_tcs_minhash, signatures[selected_tc],
+                   out=selected_tcs_minhash)
 
-        prioritized_tcs.append(selected_tc)
+        prioritized_tcs.append(tc_IDs[selected_tc])
 
         # select budget B
         if len(prioritized_tcs) >= B+1:
             break
 
-        tcs -= set([selected_tc])
-        del tcs_minhashes[selected_tc]
+        index.remove(selected_tc)
 
-    ptime = time.clock() - ptime_start
+    ptime = time.perf_counter() - ptime_start
 
     max_ts_size = sum((1 for line in open(input_file)))
     return mh_time, ptime, prioritized_tcs[1:max_ts_size]
@@ -211,106 +229,79 @@ def fast_pw(input_file, r, b, bbox=False, k=5, memory=False, B=0):
 def fast_(input_file, selsize, r, b, bbox=False, k=5, memory=False, B=0):
     n = r * b  # number of hash functions
 
-    hashes = [lsh.hashFamily(i) for i in range(n)]
+    family = lsh.minhashFamily(n)
 
     if memory:
         test_suite = loadTestSuite(input_file, bbox=bbox, k=k)
         # generate minhashes signatures
-        mh_t = time.clock()
-        tcs_minhashes = {tc[0]: lsh.tcMinhashing(tc, hashes)
-                         for tc in test_suite.items()}
-        mh_time = time.clock() - mh_t
-        ptime_start = time.clock()
+        mh_t = time.perf_counter()
+        tc_IDs, signatures = lsh.tsMinhashing(test_suite.items(), family)
+        mh_time = time.perf_counter() - mh_t
+        ptime_start = time.perf_counter()
 
     else:
         # loading input file and generating minhashes signatures
-        sigfile = input_file.replace(".txt", ".sig")
-        sigtimefile = "{}_sigtime.txt".format(input_file.split(".")[0])
-        if not os.path.exists(sigfile):
-            mh_t = time.clock()
-            storeSignatures(input_file, sigfile, hashes, bbox, k)
-            mh_time = time.clock() - mh_t
-            with open(sigtimefile, "w") as fout:
-                fout.write(repr(mh_time))
-        else:
-            with open(sigtimefile, "r") as fin:
-                mh_time = eval(fin.read().replace("\n", ""))
+        sigfile, mh_time = prepareSignatures(input_file, family, r, b,
+                                             bbox, k)
 
-        ptime_start = time.clock()
-        tcs_minhashes, load_time = loadSignatures(sigfile)
-
-    tcs = set(tcs_minhashes.keys())
+        ptime_start = time.perf_counter()
+        signatures, load_time = loadSignatures(sigfile)
+        tc_IDs = list(range(1, len(signatures) + 1))
 
     # budget B modification
     if B == 0:
-        B = len(tcs)
-
-    BASE = 0.5
-    SIZE = int(len(tcs)*BASE) + 1
+        B = len(tc_IDs)
 
-    bucket = lsh.LSHBucket(tcs_minhashes.items(), b, r, n)
+    # test cases are identified by their row in signatures
+    index = lsh.LSHIndex(signatures, b, r)
 
     prioritized_tcs = [0]
 
     # First TC
 
-    selected_tcs_minhash = lsh.tcMinhashing((0, set()), hashes)
-    first_tc = random.choice(list(tcs_minhashes.keys()))
-    for i in range(n):
-        if tcs_minhashes[first_tc][i] < selected_tcs_minhash[i]:
-            selected_tcs_minhash[i] = tcs_minhashes[first_tc][i]
-    prioritized_tcs.append(first_tc)
-    tcs -= set([first_tc])
-    del tcs_minhashes[first_tc]
-
-    iteration, total = 0, float(len(tcs_minhashes))
-    while len(tcs_minhashes) > 0:
+    selected_tcs_minhash = lsh.emptySignature(family)
+    first_tc = random.randrange(len(tc_IDs))
+    np.minimum(selected_tcs_minhash, signatures[first_tc],
+               out=selected_tcs_minhash)
+    prioritized_tcs.append(tc_IDs[first_tc])
+    index.remove(first_tc)
+
+    iteration, total = 0, float(index.size)
+    while index.size > 0:
         iteration += 1
         if iteration % 100 == 0:
             sys.stdout.write("  Progress: {}%\r".format(
                 round(100*iteration/total, 2)))
             sys.stdout.flush()
 
-        if len(tcs_minhashes) < SIZE:
-            bucket = lsh.LSHBucket(tcs_minhashes.items(), b, r, n)
-            SIZE = int(SIZE*BASE) + 1
-
-        sim_cand = lsh.LSHCandidates(bucket, (0, selected_tcs_minhash),
-                                     b, r, n)
-        filtered_sim_cand = sim_cand.difference(prioritized_tcs)
-        candidates = tcs - filtered_sim_cand
+        candidates = index.dissimilar(selected_tcs_minhash)
 
         if len(candidates) == 0:
-            selected_tcs_minhash = lsh.tcMinhashing((0, set()), hashes)
-            sim_cand = lsh.LSHCandidates(bucket, (0, selected_tcs_minhash),
-                                         b, r, n)
-            filtered_sim_cand = sim_cand.difference(prioritized_tcs)
-            candidates = tcs - filtered_sim_cand
+            selected_tcs_minhash = lsh.emptySignature(family)
+            candidates = index.dissimilar(selected_tcs_minhash)
             if len(candidates) == 0:
-                candidates = tcs_minhashes.keys()
+                candidates = index.remaining()
 
         to_sel = min(selsize(len(candidates)), len(candidates))
-        selected_tc_set = random.sample(tuple(candidates), to_sel)
+        selected_tc_set = random.sample(list(candidates), to_sel)
 
         for selected_tc in selected_tc_set:
-            for i in range(n):
-                if tcs_minhashes[selected_tc][i] < selected_tcs_minhash[i]:
-                    selected_tcs_minhash[i] = tcs_minhashes[selected_tc][i]
+            np.minimum(selected_tcs_minhash, signatures[selected_tc],
+                       out=selected_tcs_minhash)
 
-            prioritized_tcs.append(selected_tc)
+            prioritized_tcs.append(tc_IDs[selected_tc])
 
             # select budget B
             if len(prioritized_tcs) >= B+1:
                 break
 
-            tcs -= set([selected_tc])
-            del tcs_minhashes[selected_tc]
+            index.remove(selected_tc)
 
         # select budget B
         if len(prioritized_tcs) >= B+1:
             break
 
-    ptime = time.clock() - ptime_start
+    ptime = time.perf_counter() - ptime_start
 
     max_ts_size = sum((1 for line in open(input_file)))
     return mh_time, ptime, prioritized_tcs[1:max_ts_size]
@@ -335,53 +326,99 @@ def euclideanDist(v, w):
 
     return math.sqrt(d)
 
+# number of test cases vectorized and projected at once
+PREPARATION_CHUNK_SIZE = 10000
+
 # Preparation phase for FAST++ and FAST-CS
-def preparation(inputFile, dim=0):
-    vectorizer = HashingVectorizer()  # compute "TF"
-    testCases = [line.rstrip("\n") for line in open(inputFile)]
-    testSuite = vectorizer.fit_transform(testCases)
+def preparation(inputFile, dim=0, seed=None, outFile=None):
+    """INPUT
+    (str)inputFile: test suite file, streamed in chunks of test cases
+    (int)dim: dimension of the projection, from the jl lemma if <= 0
+    (int)seed: random state of the projection
+    (str)outFile: .npy file to write the projection into, kept in memory if None
+
+    OUTPUT
+    (np.ndarray)TS: float32 matrix with a projected test case in each row"""
+    with open(inputFile) as fin:
+        numTestCases = sum(1 for line in fin)
 
     # dimensionality reduction
     if dim <= 0:
         e = 0.5  # epsilon in jl lemma
-        dim = johnson_lindenstrauss_min_dim(len(testCases), eps=e)
-    srp = SparseRandomProjection(n_components=dim)
-    projectedTestSuite = srp.fit_transform(testSuite)
-
-    # map sparse matrix to dict
-    TS = []
-    for i in range(len(testCases)):
-        tc = {}
-        for j in projectedTestSuite[i].nonzero()[1]:
-            tc[j] = projectedTestSuite[i, j]
-        TS.append(tc)
+        dim = int(johnson_lindenstrauss_min_dim(numTestCases, eps=e))
+    vectorizer = HashingVectorizer()  # compute "TF", stateless
+    srp = SparseRandomProjection(n_components=dim, dense_output=True,
+                                 random_state=seed)
+    # the projection only depends on the number of features
+    srp.fit(csr_matrix((1, vectorizer.n_features)))
+
+    if outFile is None:
+        TS = np.empty((numTestCases, dim), dtype=np.float32)
+    else:
+        TS = open_memmap(outFile, mode="w+", dtype=np.float32,
+                         shape=(numTestCases, dim))
+    with open(inputFile) as fin:
+        start = 0
+        while True:
+            testCases = [line.rstrip("\n") for line in
+                         itertools.islice(fin, PREPARATION_CHUNK_SIZE)]
+            if len(testCases) == 0:
+                break
+            TS[start:start + len(testCases)] = srp.transform(
+                vectorizer.transform(testCases))
+            start += len(testCases)
 
+    if outFile is not None:
+        TS.flush()
     return TS
 
+# store the projection unless stored for the same input, dim and seed
+# Returns: preparation time, memory-mapped projection
+def cachedPreparation(inputFile, dim=0, seed=None):
+    rpFile = inputFile.replace(".txt", ".rp.npy")
+    headerFile = inputFile.replace(".txt", ".rp.json")
+    header = {"input_hash": fileHash(inputFile), "dim": dim, "seed": seed}
+
+    if os.path.exists(rpFile) and os.path.exists(headerFile):
+        with open(headerFile, "r") as fin:
+            storedHeader = json.load(fin)
+        if all(storedHeader.get(key) == value for key, value in header.items()):
+            return storedHeader["pTime"], np.load(rpFile, mmap_mode="r")
+
+    t0 = time.perf_counter()
+    preparation(inputFile, dim=dim, seed=seed, outFile=rpFile)
+    t1 = time.perf_counter()
+    header["pTime"] = t1-t0
+    # the header is written last so that an interrupted preparation is redone
+    with open(headerFile, "w") as fout:
+        json.dump(header, fout)
+    return header["pTime"], np.load(rpFile, mmap_mode="r")
+
+# squared euclidean distance of each row of TS to a vector
+def squaredDists(TS, v):
+    diff = TS - v
+    return np.einsum("ij,ij->i", diff, diff)
+
 
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
 # FAST++ Reduction phase
 def reductionPlusPlus(TS, B):
+    TS = np.asarray(TS)
     reducedTS = []
 
-    # distance to closest center
-    D = defaultdict(lambda:float('Inf'))
+    # squared distance to closest center
+    D = np.full(len(TS), float('Inf'))
     # select first center randomly
     selectedTC = random.randint(0, len(TS)-1)
     reducedTS.append(selectedTC + 1)
     D[selectedTC] = 0
 
     while len(reducedTS) < B:
-        # k-means++ tc reductionCS
-        norm = 0
-        for tc in range(len(TS)):
-            if D[tc] != 0:
-                dist = euclideanDist(TS[tc], TS[selectedTC])
-                dist *= dist
-                if dist < D[tc]:
-                    D[tc] = dist
-            norm += D[tc]
+        # k-means++ tc reduction: only the last center can get closer
+        np.minimum(D, squaredDists(TS, TS[selectedTC]), out=D)
+        cumD = np.cumsum(D)
+        norm = cumD[-1]
 
         # safe exit point (if all distances are 0)
         # (but not all test cases have been selected)
@@ -391,43 +428,31 @@ def reductionPlusPlus(TS, B):
             reducedTS.extend(extraTCS[:B-len(reducedTS)])
             break
 
-
-        c = 0
+        # proportional sampling (centers have distance 0)
         coinToss = random.random() * norm
-        for tc, dist in D.items():
-            if coinToss < c + dist:
-                reducedTS.append(tc + 1)
-                D[tc] = 0
-                break
-            c += dist
+        selectedTC = int(np.searchsorted(cumD, coinToss, side="right"))
+        reducedTS.append(selectedTC + 1)
+        D[selectedTC] = 0
 
     return reducedTS
 
 # FAST++ test suite reduction algorithm
 # Returns: preparation time, reduction time, reduced test suite
-def fastPlusPlus(inputFile, dim=0, B=0, memory=True):
+def fastPlusPlus(inputFile, dim=0, B=0, memory=True, seed=None):
     if memory:
-        t0 = time.clock()
-        TS = preparation(inputFile, dim=dim)
-        t1 = time.clock()
+        t0 = time.perf_counter()
+        TS = preparation(inputFile, dim=dim, seed=seed)
+        t1 = time.perf_counter()
         pTime = t1-t0
     else:
-        rpFile = inputFile.replace(".txt", ".rp")
-        if not os.path.exists(rpFile):
-            t0 = time.clock()
-            TS = preparation(inputFile, dim=dim)
-            t1 = time.clock()
-            pTime = t1-t0
-            pickle.dump((pTime, TS), open(rpFile, "wb"))
-        else:
-            pTime, TS = pickle.load(open(rpFile, "rb"))
+        pTime, TS = cachedPreparation(inputFile, dim=dim, seed=seed)
 
     if B <= 0:
         B = len(TS)
 
-    t2 = time.clock()
+    t2 = time.perf_counter()
     reducedTS = reductionPlusPlus(TS, B)
-    t3 = time.clock()
+    t3 = time.perf_counter()
     sTime = t3-t2
 
     return pTime, sTime, reducedTS
@@ -438,36 +463,24 @@ def fastPlusPlus(inputFile, dim=0, B=0, memory=True):
 
 # FAST-CS Reduction phase
 def reductionCS(TS, B):
+    TS = np.asarray(TS)
     reducedTS = []
 
     # compute center of mass
-    centerOfMass = defaultdict(float)
-    for tc in TS:
-        for k, v in tc.items():
-            centerOfMass[k] += v
-    # normalize
-    for k in centerOfMass.keys():
-        centerOfMass[k] /= len(TS)
+    centerOfMass = TS.mean(axis=0)
 
     # compute distances
-    D = defaultdict(float)
-    norm = 0
-    for tc in range(len(TS)):
-        dist = euclideanDist(TS[tc], centerOfMass)
-        D[tc] = dist*dist
-        norm += D[tc]
+    D = squaredDists(TS, centerOfMass)
+    norm = D.sum()
 
     # compute probabilities of being sampled
-    P = []
     if norm != 0:
-        p = 1.0 / (2*len(TS))
-        for tc in range(len(TS)):
-            P.append(p + D[tc] / (2*norm))
+        P = 1.0 / (2*len(TS)) + D / (2*norm)
     else:
-        P = [1.0 / len(TS)] * len(TS)
+        P = np.full(len(TS), 1.0 / len(TS))
 
     # numeric error: when sum of P != 1
-    P[random.randint(0, len(TS)-1)] += 1.0 - sum(P)
+    P[random.randint(0, len(TS)-1)] += 1.0 - P.sum()
 
     # proportional sampling
     reducedTS = list(np.random.choice(list(range(1, len(TS)+1)), size=B, p=P, replace=False))
@@ -476,29 +489,21 @@ def reductionCS(TS, B):
 
 # FAST-CS test suite reduction algorithm
 # Returns: preparation time, reduction time, reduced test suite
-def fastCS(inputFile, dim=0, B=0, memory=True):
+def fastCS(inputFile, dim=0, B=0, memory=True, seed=None):
     if memory:
-        t0 = time.clock()
-        TS = preparation(inputFile, dim=dim)
-        t1 = time.clock()
+        t0 = time.perf_counter()
+        TS = preparation(inputFile, dim=dim, seed=seed)
+        t1 = time.perf_counter()
         pTime = t1-t0
     else:
-        rpFile = inputFile.replace(".txt", ".rp")
-        if not os.path.exists(rpFile):
-            t0 = time.clock()
-            TS = preparation(inputFile, dim=dim)
-            t1 = time.clock()
-            pTime = t1-t0
-            pickle.dump((pTime, TS), open(rpFile, "wb"))
-        else:
-            pTime, TS = pickle.load(open(rpFile, "rb"))
+        pTime, TS = cachedPreparation(inputFile, dim=dim, seed=seed)
 
     if B <= 0:
         B = len(TS)
 
-    t2 = time.clock()
+    t2 = time.perf_counter()
     reducedTS = reductionCS(TS, B)
-    t3 = time.clock()
+    t3 = time.perf_counter()
     sTime = t3-t2
 
     return pTime, sTime, reducedTS
@@ -0,0 +1,220 @@
+"""
+This file benchmarks FAST-R test suite reduction algorithms on synthetic test suites.
+
+Run from the DataAnalysis folder: python fastr_benchmark.py [--sizes 1000 10000 100000] [--similarity 0.8]
+
+Each run appends a row per algorithm and suite size to a CSV file so that optimizations can be tracked.
+"""
+
+import argparse
+import csv
+import math
+import os
+import random
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import fastr
+
+# FAST-f candidate set sizes of FAST-R
+SELSIZES = {
+    "FAST-one": lambda x: 1,
+    "FAST-log": lambda x: int(math.log(x, 2)) + 1,
+    "FAST-sqrt": lambda x: int(math.sqrt(x)) + 1,
+    "FAST-all": lambda x: x,
+}
+ALGORITHMS = ["FAST-pw"] + list(SELSIZES) + ["FAST++", "FAST-CS"]
+DEFAULT_ALGORITHMS = ["FAST-pw", "FAST-sqrt", "FAST++", "FAST-CS"]
+COLUMNS = [
+    "timestamp",
+    "algorithm",
+    "size",
+    "similarity",
+    "budget",
+    "seed",
+    "preparation_seconds",
+    "reduction_seconds",
+    "peak_rss_mb",
+    "num_selected",
+    "cluster_coverage",
+]
+# number of covered entities of each test case
+NUM_ENTITIES = 50
+# number of distinct entities of a test suite
+VOCABULARY_SIZE = 1000000
+# number of test cases generated at once
+GENERATION_CHUNK_SIZE = 10000
+
+
+def generate_test_suite(path: str, size: int, similarity: float, seed: int = 0) -> np.ndarray:
+    """
+    Writes a synthetic test suite with a test case per line listing the entities it covers.
+
+    Test cases are variations of sqrt(size) prototypes: each entity of the prototype is kept
+    with probability similarity and replaced by a random entity otherwise.
+
+    Parameters
+    ----------
+    - size : int
+        the number of test cases
+    - similarity : float
+        the probability of test cases to share an entity with the prototype of their cluster
+
+    Returns
+    -------
+    np.ndarray : the cluster of each test case
+    """
+    rng = np.random.RandomState(seed)
+    num_clusters = max(1, int(math.sqrt(size)))
+    prototypes = rng.randint(0, VOCABULARY_SIZE, size=(num_clusters, NUM_ENTITIES))
+    clusters = rng.randint(0, num_clusters, size=size)
+    with open(path, "w") as f:
+        for start in range(0, size, GENERATION_CHUNK_SIZE):
+            chunk_clusters = clusters[start : start + GENERATION_CHUNK_SIZE]
+            shape = (len(chunk_clusters), NUM_ENTITIES)
+            is_kept = rng.random_sample(shape) < similarity
+            entities = np.where(
+                is_kept, prototypes[chunk_clusters], rng.randint(0, VOCABULARY_SIZE, size=shape)
+            )
+            f.writelines(" ".join(f"e{e}" for e in test_case) + "\n" for test_case in entities)
+    return clusters
+
+
+def prepare_test_suite(folder: str, size: int, similarity: float, seed: int):
+    """
+    Returns the path and the clusters of a synthetic test suite, generating it if it is not in the folder.
+    """
+    path = os.path.join(folder, f"suite_{size}_{similarity}_{seed}.txt")
+    clusters_path = path.replace(".txt", "_clusters.npy")
+    if os.path.exists(path) and os.path.exists(clusters_path):
+        return path, np.load(clusters_path)
+    print(f"Generate a test suite of {size} test cases with similarity {similarity} ...")
+    clusters = generate_test_suite(path, size, similarity, seed)
+    np.save(clusters_path, clusters)
+    return path, clusters
+
+
+def run_algorithm(algorithm: str, path: str, budget: int, r: int, b: int, seed: int):
+    """
+    Runs a reduction algorithm in memory and returns its preparation time, reduction time,
+    selected test cases and peak memory in MB.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    if algorithm == "FAST-pw":
+        preparation_time, reduction_time, selected = fastr.fast_pw(
+            path, r, b, memory=True, B=budget
+        )
+    elif algorithm in SELSIZES:
+        preparation_time, reduction_time, selected = fastr.fast_(
+            path, SELSIZES[algorithm], r, b, memory=True, B=budget
+        )
+    elif algorithm == "FAST++":
+        preparation_time, reduction_time, selected = fastr.fastPlusPlus(
+            path, B=budget, memory=True, seed=seed
+        )
+    elif algorithm == "FAST-CS":
+        preparation_time, reduction_time, selected = fastr.fastCS(
+            path, B=budget, memory=True, seed=seed
+        )
+    else:
+        raise ValueError(f"Algorithm {algorithm} not supported!")
+    # the maximum resident set size is reported in KB on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1 << 20) if sys.platform == "darwin" else peak_rss / (1 << 10)
+    return preparation_time, reduction_time, [int(tc) for tc in selected], peak_rss_mb
+
+
+def compute_cluster_coverage(selected: list, clusters: np.ndarray) -> float:
+    """
+    Returns the fraction of clusters covered by the selected test cases out of the clusters they could cover.
+    """
+    if len(selected) == 0:
+        return 0.0
+    selected_clusters = clusters[np.array(selected) - 1]
+    num_coverable = min(len(selected), len(np.unique(clusters)))
+    return len(np.unique(selected_clusters)) / num_coverable
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark FAST-R test suite reduction algorithms on synthetic test suites."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="numbers of test cases of the synthetic test suites",
+    )
+    parser.add_argument(
+        "--similarity",
+        type=float,
+        default=0.8,
+        help="probability of test cases to share a covered entity with the prototype of their cluster",
+    )
+    parser.add_argument(
+        "--algorithms",
+        nargs="+",
+        choices=ALGORITHMS,
+        default=DEFAULT_ALGORITHMS,
+        help="algorithms to benchmark",
+    )
+    parser.add_argument("--budget", type=int, default=100, help="number of test cases to select")
+    parser.add_argument("-r", type=int, default=1, help="number of rows of each LSH band")
+    parser.add_argument("-b", type=int, default=10, help="number of LSH bands")
+    parser.add_argument("--seed", type=int, default=0, help="seed of test suites and algorithms")
+    parser.add_argument(
+        "--suites", default="fastr_benchmark_suites", help="folder storing generated test suites"
+    )
+    parser.add_argument(
+        "--output", default="fastr_benchmark.csv", help="CSV file to append results to"
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.suites, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    is_new_output = not os.path.exists(args.output)
+    with open(args.output, "a", newline="") as f:
+        writer = csv.writer(f)
+        if is_new_output:
+            writer.writerow(COLUMNS)
+        for size in args.sizes:
+            path, clusters = prepare_test_suite(args.suites, size, args.similarity, args.seed)
+            for algorithm in args.algorithms:
+                # a fresh process per run so that peak memory is not shared between runs
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    preparation_time, reduction_time, selected, peak_rss_mb = executor.submit(
+                        run_algorithm, algorithm, path, args.budget, args.r, args.b, args.seed
+                    ).result()
+                cluster_coverage = compute_cluster_coverage(selected, clusters)
+                writer.writerow(
+                    [
+                        timestamp,
+                        algorithm,
+                        size,
+                        args.similarity,
+                        args.budget,
+                        args.seed,
+                        f"{preparation_time:.4f}",
+                        f"{reduction_time:.4f}",
+                        f"{peak_rss_mb:.1f}",
+                        len(selected),
+                        f"{cluster_coverage:.4f}",
+                    ]
+                )
+                f.flush()
+                print(
+                    f"{algorithm} on {size} test cases: preparation {preparation_time:.3f}s, "
+                    f"reduction {reduction_time:.3f}s, peak memory {peak_rss_mb:.1f}MB, "
+                    f"cluster coverage {cluster_coverage:.3f}"
+                )
+    print(f"Results are appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
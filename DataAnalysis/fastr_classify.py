@@ -1,22 +1,49 @@
 import fastr
+import argparse
 import os
 import csv
+import random
 import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-def main():
-    dim = 10
-    B = 3
-    DATASET_PATH = "../FastDataset"
+import numpy as np
+
+DIM = 10
+B = 3
+DATASET_PATH = "../FastDataset"
+TRUTH = ["buggy", "fixed", "similar"]
+
+
+def task_seed(seed, project, bug, trial):
+    """
+    Derives the seed of a classification from the base seed, so that it does not depend on the worker running it.
+    """
+    return zlib.crc32(f"{seed}/{project}/{bug}/{trial}".encode())
+
+
+def classify_bug(task):
+    """
+    Classifies the scenarios of a bug with FAST++ and returns one CSV row per scenario.
+    """
+    project, bug, trial, file_path, seed = task
+    random.seed(seed)
+    np.random.seed(seed)
+    _, _, sel = fastr.fastPlusPlus(file_path, dim=DIM, B=B, seed=seed)
+    classification = ["", "", ""]
+    classification[sel[0] - 1] = "similar"
+    classification[sel[1] - 1] = "fixed"
+    classification[sel[2] - 1] = "buggy"
+    return [[project, bug, classification[i], TRUTH[i], trial] for i in range(3)]
+
+
+def main(dataset_path=DATASET_PATH, num_workers=None, num_trials=1, seed=0):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     RESULTS_PATH = f"fastr_classification_{timestamp}.csv"
-    # Write CSV header
-    header = ["project", "bug", "classified_scenario", "target_scenario"]
-    with open(RESULTS_PATH, mode="w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(header) 
-    # FAST-R classification
-    for filename in os.listdir(DATASET_PATH):
+    # Collect classification tasks in a fixed order
+    tasks = []
+    for filename in sorted(os.listdir(dataset_path)):
         # Parse bug name
         pattern = rf"([-A-Za-z]+)_(\d+)\.txt"
         matched_name = re.search(
@@ -25,19 +52,58 @@ def main():
         )
         project = matched_name.group(1)
         bug = matched_name.group(2)
-        # Classify scenario
-        file_path = os.path.join(DATASET_PATH, filename)
-        _, _, sel = fastr.fastPlusPlus(file_path, dim=dim, B=B)
-        truth = ["buggy", "fixed", "similar"]
-        classification = ["", "", ""]
-        classification[sel[0] - 1] = "similar"
-        classification[sel[1] - 1] = "fixed"
-        classification[sel[2] - 1] = "buggy"
-        with open(RESULTS_PATH, mode="a", newline="") as f:
-            writer = csv.writer(f)
-            for i in range(3):
-                writer.writerow([project, bug, classification[i], truth[i]])
-        print(f"Classify project {project} bug {bug}.")
+        file_path = os.path.join(dataset_path, filename)
+        for trial in range(num_trials):
+            tasks.append(
+                (project, bug, trial, file_path, task_seed(seed, project, bug, trial))
+            )
+    # FAST-R classification, writing rows in task order as they are ready
+    header = ["project", "bug", "classified_scenario", "target_scenario", "trial"]
+    with open(RESULTS_PATH, mode="w", newline="") as f, ProcessPoolExecutor(
+        max_workers=num_workers
+    ) as executor:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        chunksize = max(1, len(tasks) // (4 * (num_workers or os.cpu_count() or 1)))
+        for task, rows in zip(
+            tasks, executor.map(classify_bug, tasks, chunksize=chunksize)
+        ):
+            writer.writerows(rows)
+            project, bug, trial = task[:3]
+            print(f"Classify project {project} bug {bug} trial {trial}.")
+    print(f"Results are saved in {RESULTS_PATH}")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Classify scenarios of FastDataset bugs with FAST++."
+    )
+    parser.add_argument(
+        "-d",
+        "--dataset",
+        default=DATASET_PATH,
+        help=f"Folder of test suites to classify, by default {DATASET_PATH}.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help=f"Number of processes classifying bugs in parallel, by default the number of CPUs.",
+    )
+    parser.add_argument(
+        "-t",
+        "--trials",
+        type=int,
+        default=1,
+        help=f"Number of classifications of each bug with different seeds to estimate the variance.",
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        default=0,
+        help=f"Base seed from which the seed of each classification is derived.",
+    )
+    args = parser.parse_args()
+    main(args.dataset, args.workers, args.trials, args.seed)
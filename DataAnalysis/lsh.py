@@ -17,6 +17,7 @@ from collections import defaultdict
 from collections import OrderedDict
 import itertools
 
+import numpy as np
 import xxhash
 
 """
@@ -80,6 +81,94 @@ def tcMinhashing(test_case, hash_functions):
     return tc_signature
 
 
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# VECTORIZED MINWISEHASHING
+
+# largest prime below 2^32: (a*x + b) of values below it fits in uint64
+PRIME = np.uint64(4294967291)
+# minhash of an empty test case, greater than any hash value
+EMPTY_HASH = np.iinfo(np.uint64).max
+# maximum number of hash values computed at once
+CHUNK_SIZE = 1 << 22
+
+# generate a family of universal hash functions h(x) = (a*x + b) mod p
+def minhashFamily(n, seed=37):
+    """INPUT
+    (int)n: number of hash functions
+    (int)seed: random seed of the coefficients
+
+    OUTPUT
+    (pair)family: (a, b) uint64 arrays of coefficients with shape (n, 1)"""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, int(PRIME), size=(n, 1), dtype=np.uint64)
+    b = rng.randint(0, int(PRIME), size=(n, 1), dtype=np.uint64)
+    return a, b
+
+# hash the shingles of a test case once to uint64 values below PRIME
+def shingleHashes(tc_shingles):
+    """INPUT
+    (set)tc_shingles: set of entities or k-shingles
+
+    OUTPUT
+    (np.ndarray)hashes: uint64 array of shingle hashes"""
+    return np.fromiter(
+        (xxhash.xxh64(str(tc_shingle).encode(), seed=37).intdigest() % int(PRIME)
+         for tc_shingle in tc_shingles),
+        dtype=np.uint64, count=len(tc_shingles))
+
+# return the signature of an empty test case
+def emptySignature(family):
+    return np.full(len(family[0]), EMPTY_HASH, dtype=np.uint64)
+
+# compute minhashing of a single test case with a family of universal hash functions
+def tcMinhashingNp(test_case, family):
+    """INPUT
+    (pair)test_case: (tcID, set of entities)
+    (pair)family: coefficients of hash functions from minhashFamily
+
+    OUTPUT
+    (np.ndarray)tc_signature: uint64 array of minhash values (signature)"""
+    tc_ID, tc_shingles = test_case
+    if len(tc_shingles) == 0:
+        return emptySignature(family)
+    a, b = family
+    x = shingleHashes(tc_shingles)
+    return ((a * x + b) % PRIME).min(axis=1)
+
+# compute minhashing of all test cases of a test suite
+def tsMinhashing(test_cases, family):
+    """INPUT
+    (iterable(pair))test_cases: (tcID, set of entities) of each test case
+    (pair)family: coefficients of hash functions from minhashFamily
+
+    OUTPUT
+    (list)tc_IDs: list of test case IDs
+    (np.ndarray)signatures: uint64 matrix with the signature of each test case in a row"""
+    a, b = family
+    n = len(a)
+    tc_IDs, tc_hashes = [], []
+    for tc_ID, tc_shingles in test_cases:
+        tc_IDs.append(tc_ID)
+        tc_hashes.append(shingleHashes(tc_shingles))
+    signatures = np.full((len(tc_IDs), n), EMPTY_HASH, dtype=np.uint64)
+    # minhash chunks of test cases with all their shingles at once
+    start = 0
+    while start < len(tc_IDs):
+        end, size = start, 0
+        while end < len(tc_IDs) and (end == start or (size + len(tc_hashes[end])) * n <= CHUNK_SIZE):
+            size += len(tc_hashes[end])
+            end += 1
+        non_empty = [i for i in range(start, end) if len(tc_hashes[i]) > 0]
+        if non_empty:
+            x = np.concatenate([tc_hashes[i] for i in non_empty])
+            offsets = np.cumsum([0] + [len(tc_hashes[i]) for i in non_empty[:-1]])
+            minhashes = np.minimum.reduceat((a * x + b) % PRIME, offsets, axis=1)
+            signatures[non_empty] = minhashes.T
+        start = end
+
+    return tc_IDs, signatures
+
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 # LOCALITY SENSITIVE HASHING (LSH)
 
@@ -140,6 +229,91 @@ def LSHCandidates(bucket, signature, b, r, n):
     return candidates
 
 
+# # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+# ARRAY-BACKED LSH INDEX
+
+# odd multiplier mixing the rows of a band into a single hash
+BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# compute the hash of each band of each signature
+def bandHashes(signatures, b, r):
+    """INPUT
+    (np.ndarray)signatures: uint64 matrix with a signature in each row
+    (int)b: number of bands
+    (int)r: number of rows
+
+    OUTPUT
+    (np.ndarray)band_hashes: uint64 matrix with the b band hashes of each signature"""
+    bands = np.asarray(signatures).reshape(len(signatures), b, r)
+    band_hashes = bands[:, :, 0].copy()
+    for i in range(1, r):
+        band_hashes *= BAND_MULTIPLIER
+        band_hashes ^= bands[:, :, i]
+    return band_hashes
+
+
+class LSHIndex:
+    """LSH index of a signature matrix backed by NumPy arrays.
+
+    The band hashes of all signatures are computed at once and sorted per
+    band, so that the test cases sharing a bucket with a signature are found
+    by binary search. Removed test cases are masked out without rebuilding
+    the index. Test cases are identified by their row in the matrix."""
+
+    def __init__(self, signatures, b, r):
+        """INPUT
+        (np.ndarray)signatures: uint64 matrix with a signature in each row
+        (int)b: number of bands
+        (int)r: number of rows"""
+        assert(b * r == signatures.shape[1])
+        self.b, self.r = b, r
+
+        band_hashes = bandHashes(signatures, b, r).T
+        # rows of signatures sorted by band hash in each band
+        self.sorted_rows = np.argsort(band_hashes, axis=1, kind="stable")
+        self.sorted_hashes = band_hashes[np.arange(b)[:, None], self.sorted_rows]
+        self.alive = np.ones(len(signatures), dtype=bool)
+        self.size = len(signatures)
+
+    # remove test cases, e.g., after prioritizing them
+    def remove(self, rows):
+        rows = np.unique(np.atleast_1d(rows))
+        self.size -= np.count_nonzero(self.alive[rows])
+        self.alive[rows] = False
+
+    # return the rows of test cases not removed yet
+    def remaining(self):
+        return np.flatnonzero(self.alive)
+
+    # return the possibly similar test cases of each signature
+    def query(self, signatures):
+        """INPUT
+        (np.ndarray)signatures: uint64 matrix with a query signature in each row
+
+        OUTPUT
+        (list(np.ndarray))candidates: sorted rows of remaining test cases sharing a bucket with each signature"""
+        query_hashes = bandHashes(np.atleast_2d(signatures), self.b, self.r)
+        bounds = []
+        for band in range(self.b):
+            bounds.append((
+                np.searchsorted(self.sorted_hashes[band], query_hashes[:, band], side="left"),
+                np.searchsorted(self.sorted_hashes[band], query_hashes[:, band], side="right")))
+
+        candidates = []
+        for q in range(len(query_hashes)):
+            rows = np.unique(np.concatenate([
+                self.sorted_rows[band, lo[q]:hi[q]]
+                for band, (lo, hi) in enumerate(bounds)]))
+            candidates.append(rows[self.alive[rows]])
+        return candidates
+
+    # return the remaining test cases not sharing any bucket with a signature
+    def dissimilar(self, signature):
+        mask = self.alive.copy()
+        mask[self.query(signature)[0]] = False
+        return np.flatnonzero(mask)
+
+
 # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 # JACCARD SIMILARITY/DISTANCE EXACT AND ESTIMATES
 
@@ -154,8 +328,14 @@ def jDistance(a, b):
 # estimate jaccard similarity using minhashing
 def jSimilarityEstimate(s1, s2):
     assert(len(s1) == len(s2))
+    if isinstance(s1, np.ndarray):
+        return np.count_nonzero(s1 == s2) / float(len(s1))
     return sum([1 for i in range(len(s1)) if s1[i] == s2[i]]) / float(len(s1))
 
 # estimate jaccard distance using minhashing
 def jDistanceEstimate(s1, s2):
     return 1.0 - jSimilarityEstimate(s1, s2)
+
+# estimate jaccard distances of a signature to each row of a signature matrix
+def jDistanceEstimates(signature, signatures):
+    return 1.0 - np.count_nonzero(signatures == signature, axis=1) / float(len(signature))